@@ -0,0 +1,109 @@
+"""Time the restructuring pipeline on synthetic packages of increasing size.
+
+uv run python -m benchmarks.run --sizes 100 1000 --output benchmarks/results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+from datetime import UTC, datetime
+from typing import Any
+
+import attrs
+
+from benchmarks.synthetic import SyntheticSpec, generate_package
+from spaghettree.__main__ import RunConfig, run_process
+from spaghettree.adapters.instrumentation import Instrumentation
+from spaghettree.adapters.io_wrapper import FakeIOWrapper
+
+SIZES = (100, 1_000, 10_000, 50_000)
+
+
+def run_pipeline(
+    files: dict[str, str],
+    src_root: str,
+    config: RunConfig,
+    *,
+    track_memory: bool = True,
+) -> dict[str, Any]:
+    """Run `run_process` in memory, returning the time and memory each stage took."""
+    io = FakeIOWrapper(files=dict(files))
+    instrumentation = Instrumentation(track_memory=track_memory)
+    config = attrs.evolve(config, instrumentation=instrumentation)
+
+    res = run_process(io, src_root, "./benchmark_out", config)
+    if not res.is_ok():
+        raise res.error or RuntimeError(f"pipeline failed: {res}")
+    return instrumentation.report()
+
+
+def run_benchmarks(
+    sizes: tuple[int, ...],
+    config: RunConfig,
+    *,
+    track_memory: bool = True,
+) -> list[dict[str, Any]]:
+    results = []
+    for n_entities in sizes:
+        spec = SyntheticSpec.for_entities(n_entities)
+        files = generate_package(spec)
+
+        start = time.perf_counter()
+        report = run_pipeline(files, f"./{spec.package}/src", config, track_memory=track_memory)
+        total = time.perf_counter() - start
+
+        results.append({"n_entities": spec.n_entities, "n_files": spec.n_files, **report})
+        print(f"{spec.n_entities} entities: {total:.2f}s")  # noqa: T201
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.strip()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="benchmarks.run")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--engine", default="greedy")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="skip tracing memory, which slows the stages down",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    config = RunConfig(engine=args.engine, jobs=args.jobs)
+    results = run_benchmarks(tuple(args.sizes), config, track_memory=not args.no_memory)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "engine": args.engine,
+        "jobs": args.jobs,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
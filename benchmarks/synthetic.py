@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from typing import Self
+
+import attrs
+import numpy as np
+
+
+@attrs.define(frozen=True)
+class SyntheticSpec:
+    """Shape of a generated package.
+
+    Each function and method makes a Poisson distributed number of calls, averaging
+    `calls_per_func`. A `locality` fraction of them go to the same file. The rest pick a file with
+    Zipf weights skewed by `hub_skew`, so a few modules are called from everywhere like the utils
+    module of a real package.
+    """
+
+    n_files: int = attrs.field()
+    funcs_per_file: int = attrs.field(default=6)
+    classes_per_file: int = attrs.field(default=1)
+    methods_per_class: int = attrs.field(default=3)
+    globals_per_file: int = attrs.field(default=1)
+    calls_per_func: float = attrs.field(default=3.0)
+    locality: float = attrs.field(default=0.7)
+    hub_skew: float = attrs.field(default=1.0)
+    package: str = attrs.field(default="synthetic")
+    seed: int = attrs.field(default=0)
+
+    @classmethod
+    def for_entities(cls, n_entities: int, **kwargs: float | str) -> Self:
+        """A spec whose files together hold about `n_entities` top level entities."""
+        spec = cls(1, **kwargs)
+        return attrs.evolve(spec, n_files=max(1, round(n_entities / spec.entities_per_file)))
+
+    @property
+    def entities_per_file(self) -> int:
+        return self.funcs_per_file + self.classes_per_file + self.globals_per_file
+
+    @property
+    def n_entities(self) -> int:
+        return self.n_files * self.entities_per_file
+
+
+def generate_package(spec: SyntheticSpec, root: str = ".") -> dict[str, str]:
+    """Source of every file in a package matching `spec`, keyed by path under `root`."""
+    rng = np.random.default_rng(spec.seed)
+    hub_weights = 1 / np.arange(1, spec.n_files + 1) ** spec.hub_skew
+    hub_weights /= hub_weights.sum()
+
+    def pick_callee(file_idx: int) -> tuple[int, str]:
+        if spec.n_files == 1 or rng.random() < spec.locality:
+            target = file_idx
+        else:
+            target = int(rng.choice(spec.n_files, p=hub_weights))
+        if spec.classes_per_file and rng.random() < 0.1:  # noqa: PLR2004
+            return target, f"Class{target}_{rng.integers(spec.classes_per_file)}"
+        return target, f"func_{target}_{rng.integers(spec.funcs_per_file)}"
+
+    def body(file_idx: int, imports: set[tuple[int, str]]) -> str:
+        terms = ["x"]
+        for _ in range(rng.poisson(spec.calls_per_func)):
+            target, callee = pick_callee(file_idx)
+            if target != file_idx:
+                imports.add((target, callee))
+            terms.append(f"{callee}(x)" if callee.startswith("func") else f"{callee}().method_0(x)")
+        if spec.globals_per_file and rng.random() < 0.3:  # noqa: PLR2004
+            terms.append(f"CONST_{file_idx}_{rng.integers(spec.globals_per_file)}")
+        return " + ".join(terms)
+
+    pkg_dir = f"{root}/{spec.package}/src/{spec.package}"
+    files = {f"{pkg_dir}/__init__.py": ""}
+
+    for file_idx in range(spec.n_files):
+        imports: set[tuple[int, str]] = set()
+        blocks = [f"CONST_{file_idx}_{idx} = {idx}" for idx in range(spec.globals_per_file)]
+
+        blocks.extend(
+            f"def func_{file_idx}_{idx}(x: int) -> int:\n    return {body(file_idx, imports)}"
+            for idx in range(spec.funcs_per_file)
+        )
+
+        for cls_idx in range(spec.classes_per_file):
+            methods = "\n\n".join(
+                f"    def method_{idx}(self, x: int) -> int:\n"
+                f"        return {body(file_idx, imports)}"
+                for idx in range(max(1, spec.methods_per_class))
+            )
+            blocks.append(f"class Class{file_idx}_{cls_idx}:\n{methods}")
+
+        import_lines = [
+            f"from {spec.package}.module_{target} import {name}" for target, name in sorted(imports)
+        ]
+        code = "\n\n\n".join(["\n".join(import_lines), *blocks] if import_lines else blocks)
+        files[f"{pkg_dir}/module_{file_idx}.py"] = code + "\n"
+
+    return files
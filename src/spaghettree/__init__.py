@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import functools
+import reprlib
+import traceback
 from collections.abc import Callable
 from types import TracebackType
 from typing import (
@@ -17,6 +19,32 @@ T = TypeVar("T")
 P = ParamSpec("P")
 
 
+class BoundedRepr(reprlib.Repr):
+    """A `reprlib.Repr` that never builds the full repr of an object it doesn't know.
+
+    The default falls back to `repr` then truncates, which for a large object like the parsed
+    modules of a package costs as much as the object itself.
+    """
+
+    def repr_instance(self, obj: Any, level: int) -> str:  # noqa: ANN401
+        if type(obj).__module__ == "builtins" and not isinstance(obj, bytes | bytearray):
+            return super().repr_instance(obj, level)
+        return f"<{type(obj).__qualname__}>"
+
+
+# the arguments and locals an `Err` keeps are reduced to reprs of at most a few hundred characters
+ERR_REPR = BoundedRepr(
+    maxlevel=2,
+    maxtuple=4,
+    maxlist=4,
+    maxdict=4,
+    maxset=4,
+    maxfrozenset=4,
+    maxstring=80,
+    maxother=80,
+)
+
+
 @attrs.define
 class Ok:
     inner: Any = attrs.field(default=None)
@@ -44,6 +72,7 @@ class Err:
         self.err_msg = str(self.error)
         if self.error:
             self.details = self._extract_details(self.error.__traceback__)
+            release_traceback(self.error)
 
     def _extract_details(self, tb: TracebackType | None) -> list[dict[str, Any]]:
         trace_info = []
@@ -54,7 +83,9 @@ class Err:
                     "file": frame.f_code.co_filename,
                     "func": frame.f_code.co_name,
                     "line_no": tb.tb_lineno,
-                    "locals": frame.f_locals,
+                    "locals": {
+                        name: ERR_REPR.repr(value) for name, value in frame.f_locals.items()
+                    },
                 },
             )
             tb = tb.tb_next
@@ -76,11 +107,29 @@ def safe[**P, T](func: Callable[P, T]) -> Callable[P, Result]:
         try:
             return Ok(func(*args, **kwargs))
         except Exception as e:  # noqa: BLE001
-            return Err((args, kwargs), e)
+            return Err(ERR_REPR.repr((args, kwargs)), e)
 
     return wrapper
 
 
+def release_traceback(error: BaseException) -> None:
+    """Drop the frames held by `error` and the exceptions chained to it.
+
+    The traceback would otherwise keep every local of every frame alive for as long as the error
+    is kept. Where each exception was raised is kept as a note, shown if it is raised again.
+    """
+    pending, seen = [error], set()
+    while pending:
+        exc = pending.pop()
+        if exc is None or id(exc) in seen:
+            continue
+        seen.add(id(exc))
+        if exc.__traceback__ is not None:
+            exc.add_note("Raised at:\n" + "".join(traceback.format_tb(exc.__traceback__)))
+            exc.__traceback__ = None
+        pending.extend((exc.__cause__, exc.__context__))
+
+
 __all__ = [
     "Err",
     "Ok",
@@ -1,14 +1,35 @@
+import argparse
+import multiprocessing
+import re
+import time
+from collections.abc import Callable
 from functools import partial
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
 
-from spaghettree import Result
+import attrs
+
+from spaghettree import Ok, Result
+from spaghettree.adapters.formatting import FORMATTERS, format_files
+from spaghettree.adapters.instrumentation import Instrumentation, StageFunc, untracked
 from spaghettree.adapters.io_wrapper import IOProtocol, IOWrapper
+from spaghettree.adapters.parse_cache import ParseCache, default_cache_dir
 from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.annealing import optimise_communities_sa
+from spaghettree.domain.genetic import optimise_communities_gen
+from spaghettree.domain.hill_climbing import optimise_communities_hc
+from spaghettree.domain.louvain import optimise_communities_louvain
+from spaghettree.domain.multistart import StartResult, optimise_multi_start
 from spaghettree.domain.optimisation import (
+    get_dwm,
+    get_module_communities,
+    get_partition,
     merge_single_entity_communities_if_no_gain_penalty,
     optimise_communities,
+    warm_start_communities,
 )
 from spaghettree.domain.parsing import (
-    create_call_tree,
+    create_call_graph,
     create_module_cst_objs,
     extract_entities,
     filter_non_native_calls,
@@ -25,51 +46,542 @@ from spaghettree.domain.processing import (
     remap_imports,
     rename_overlapping_mod_names,
 )
+from spaghettree.domain.protocols import CacheProtocol
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on windows
+    resource = None
+
+
+OPTIMISERS: dict[str, Callable[..., Result]] = {
+    "greedy": optimise_communities,
+    "louvain": partial(optimise_communities_louvain, refine=False),
+    "leiden": optimise_communities_louvain,
+}
+# local searches run on the optimiser's communities, in the order given
+REFINERS: dict[str, Callable[..., Result]] = {
+    "hc": optimise_communities_hc,
+    "sa": optimise_communities_sa,
+    "gen": optimise_communities_gen,
+}
+# refiners that spread their work over `RunConfig.jobs` processes
+PARALLEL_REFINERS = {"gen"}
+
+
+@attrs.define(frozen=True)
+class RunConfig:
+    engine: str = attrs.field(default="greedy", validator=attrs.validators.in_(OPTIMISERS))
+    restarts: int = attrs.field(default=1, validator=attrs.validators.ge(1))
+    refiners: tuple[str, ...] = attrs.field(
+        default=(),
+        converter=tuple,
+        validator=attrs.validators.deep_iterable(attrs.validators.in_(REFINERS)),
+    )
+    max_iters: int | None = attrs.field(default=None)
+    plateau: int | None = attrs.field(default=None)
+    seed: int | None = attrs.field(default=None)
+    time_budget: float | None = attrs.field(default=None)
+    jobs: int = attrs.field(default=1)
+    cache: CacheProtocol | None = attrs.field(default=None)
+    formatter: str = attrs.field(default="ruff", validator=attrs.validators.in_(FORMATTERS))
+    format_cache: CacheProtocol | None = attrs.field(default=None)
+    prune: bool = attrs.field(default=False)
+    partition_path: str | None = attrs.field(default=None)
+    on_start: Callable[[int, StartResult], None] | None = attrs.field(default=None)
+    instrumentation: Instrumentation | None = attrs.field(default=None)
+    report_path: str | None = attrs.field(default=None)
+
+    def refiner_options(self, refiner: str) -> dict:
+        options = {
+            "max_iters": self.max_iters,
+            "plateau": self.plateau,
+            "seed": self.seed,
+            "time_budget": self.time_budget,
+        }
+        if refiner in PARALLEL_REFINERS:
+            options["jobs"] = self.jobs
+        return options
+
+    def optimiser(self) -> Callable[[AdjMat], Result]:
+        if self.restarts == 1:
+            return partial(OPTIMISERS[self.engine], seed=self.seed)
+        return partial(
+            optimise_multi_start,
+            optimiser=OPTIMISERS[self.engine],
+            restarts=self.restarts,
+            jobs=self.jobs,
+            seed=self.seed,
+            on_start=self.on_start,
+        )
 
 
-def main(src_root: str, new_root: str) -> Result:
+def main(src_root: str, new_root: str, config: RunConfig | None = None) -> Result:
     io = IOWrapper()
-    return run_process(io, src_root, new_root)
+    return run_process(io, src_root, new_root, config)
+
+
+def run_process(
+    io: IOProtocol,
+    src_root: str,
+    new_root: str,
+    config: RunConfig | None = None,
+) -> Result:
+    config = config or RunConfig()
+    instrumentation = config.instrumentation
+    if config.report_path and instrumentation is None:
+        instrumentation = Instrumentation()
+    stage = instrumentation.stage if instrumentation is not None else untracked
 
+    try:
+        return _run_stages(io, src_root, new_root or src_root, config, stage)
+    finally:
+        if config.report_path and instrumentation is not None:
+            io.write_json(instrumentation.report(), config.report_path)
 
-def run_process(io: IOProtocol, src_root: str, new_root: str) -> Result:
-    src_code = io.read_files(src_root)
+
+def _run_stages(
+    io: IOProtocol,
+    src_root: str,
+    new_root: str,
+    config: RunConfig,
+    stage: Callable[[str, StageFunc], StageFunc],
+) -> Result:
+    modules_res = stage("read", io.stream_files)(src_root).and_then(
+        stage("parse", partial(create_module_cst_objs, jobs=config.jobs, cache=config.cache)),
+    )
 
     entities_res = (
-        src_code.and_then(create_module_cst_objs)
-        .and_then(resolve_module_calls)
-        .and_then(extract_entities)
-        .and_then(filter_non_native_calls)
+        modules_res.and_then(stage("resolve", resolve_module_calls))
+        .and_then(stage("extract", extract_entities))
+        .and_then(stage("filter", filter_non_native_calls))
     )
 
     if not entities_res.is_ok():
         raise entities_res.error
 
     entities = entities_res.inner
-    location_map_res = src_code.and_then(get_location_map)
+    location_map_res = modules_res.and_then(stage("locations", get_location_map))
 
     if not location_map_res.is_ok():
         raise location_map_res.error
 
     location_map = location_map_res.inner
 
+    # a missing or unreadable partition from a previous run means a cold start
+    partition = None
+    if config.partition_path and (partition_res := io.read_json(config.partition_path)).is_ok():
+        partition = partition_res.inner
+
+    adj_mat_res = (
+        entities_res.and_then(stage("call_graph", create_call_graph))
+        .and_then(stage("adj_mat", AdjMat.from_call_graph))
+        .and_then(stage("warm_start", partial(warm_start_communities, partition=partition)))
+        .and_then(stage("pairing", pair_exclusive_calls))
+        .and_then(stage("optimise", config.optimiser()))
+    )
+    for refiner in config.refiners:
+        adj_mat_res = adj_mat_res.and_then(
+            stage(
+                f"refine_{refiner}",
+                partial(REFINERS[refiner], **config.refiner_options(refiner)),
+            ),
+        )
+    adj_mat_res = adj_mat_res.and_then(
+        stage("merge_singles", merge_single_entity_communities_if_no_gain_penalty),
+    )
+
+    if config.partition_path and adj_mat_res.is_ok():
+        io.write_json(get_partition(adj_mat_res.inner), config.partition_path)
+
     return (
-        entities_res.and_then(create_call_tree)
-        .and_then(AdjMat.from_call_tree)
-        .and_then(pair_exclusive_calls)
-        .and_then(optimise_communities)
-        .and_then(merge_single_entity_communities_if_no_gain_penalty)
-        .and_then(partial(create_new_module_map, entities=entities))
-        .and_then(infer_module_names)
-        .and_then(rename_overlapping_mod_names)
-        .and_then(remap_imports)
+        adj_mat_res.and_then(stage("module_map", partial(create_new_module_map, entities=entities)))
+        .and_then(stage("naming", infer_module_names))
+        .and_then(stage("renaming", rename_overlapping_mod_names))
+        .and_then(stage("remap_imports", remap_imports))
+        .and_then(stage("codegen", partial(convert_to_code_str, order_map=location_map)))
+        .and_then(stage("filepaths", partial(create_new_filepaths, new_root=new_root)))
+        .and_then(stage("inits", add_empty_inits_if_needed))
+        .and_then(
+            stage(
+                "format",
+                partial(
+                    format_files,
+                    formatter=config.formatter,
+                    jobs=config.jobs,
+                    cache=config.format_cache,
+                ),
+            ),
+        )
         .and_then(
-            partial(
-                convert_to_code_str,
-                order_map=location_map,
+            stage(
+                "write",
+                partial(
+                    io.write_files,
+                    format_code=False,
+                    prune_root=new_root if config.prune else None,
+                ),
             ),
         )
-        .and_then(partial(create_new_filepaths, new_root=new_root or src_root))
-        .and_then(add_empty_inits_if_needed)
-        .and_then(partial(io.write_files, ruff_root=new_root or src_root))
     )
+
+
+@attrs.define(frozen=True)
+class BatchResult:
+    root: str = attrs.field()
+    status: str = attrs.field()
+    n_entities: int | None = attrs.field(default=None)
+    dwm_before: float | None = attrs.field(default=None)
+    dwm_after: float | None = attrs.field(default=None)
+    wall_s: float | None = attrs.field(default=None)
+    error: str | None = attrs.field(default=None)
+
+
+def run_batch(  # noqa: PLR0913
+    roots: list[str],
+    out_dir: str,
+    config: RunConfig | None = None,
+    *,
+    jobs: int = 1,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+) -> list[BatchResult]:
+    """Restructure each of `roots` into its own directory under `out_dir`, `jobs` at a time.
+
+    Every package runs in its own process, which is killed if it takes longer than `timeout`
+    seconds. Its address space is capped at `memory_limit` bytes where the platform supports it,
+    so one pathological package only fails its own row of the results.
+    """
+    config = config or RunConfig()
+    ctx = multiprocessing.get_context("spawn")
+    pending = list(enumerate(roots))[::-1]
+    running: dict[int, tuple[multiprocessing.process.BaseProcess, Connection, float]] = {}
+    results: dict[int, BatchResult] = {}
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            idx, root = pending.pop()
+            recv, send = ctx.Pipe(duplex=False)
+            proc = ctx.Process(
+                target=_run_batch_item,
+                args=(root, batch_new_root(out_dir, idx, root), config, memory_limit, send),
+                daemon=True,
+            )
+            proc.start()
+            send.close()
+            running[idx] = (proc, recv, time.monotonic())
+
+        wait(
+            [conn for _, conn, _ in running.values()]
+            + [proc.sentinel for proc, _, _ in running.values()],
+            timeout=0.1 if timeout is not None else None,
+        )
+
+        for idx, (proc, recv, started) in list(running.items()):
+            root = roots[idx]
+            if recv.poll():
+                try:
+                    results[idx] = recv.recv()
+                except EOFError:
+                    results[idx] = BatchResult(root, "crashed", error=f"exit {proc.exitcode}")
+            elif not proc.is_alive():
+                results[idx] = BatchResult(root, "crashed", error=f"exit {proc.exitcode}")
+            elif timeout is not None and time.monotonic() - started > timeout:
+                proc.kill()
+                results[idx] = BatchResult(root, "timeout", wall_s=time.monotonic() - started)
+            else:
+                continue
+
+            proc.join()
+            recv.close()
+            del running[idx]
+
+    return [results[idx] for idx in range(len(roots))]
+
+
+def batch_new_root(out_dir: str, idx: int, root: str) -> str:
+    parts = [part for part in Path(root).parts if part not in {"/", ".", "..", "src"}]
+    name = re.sub(r"[^\w.-]", "_", "_".join(parts[-2:])) or "package"
+    return str(Path(out_dir) / f"{idx:03d}_{name}")
+
+
+def batch_item_config(config: RunConfig, new_root: str) -> RunConfig:
+    """`config` with its partition and report files moved into the package's `new_root`.
+
+    Otherwise every package of a batch would warm start from and write over the same files.
+    """
+
+    def in_new_root(path: str | None) -> str | None:
+        return str(Path(new_root) / Path(path).name) if path else None
+
+    return attrs.evolve(
+        config,
+        partition_path=in_new_root(config.partition_path),
+        report_path=in_new_root(config.report_path),
+    )
+
+
+def format_batch_table(results: list[BatchResult]) -> str:
+    def fmt(value: float | None, spec: str) -> str:
+        return "-" if value is None else format(value, spec)
+
+    rows = [("root", "status", "entities", "dwm before", "dwm after", "wall s", "error")]
+    rows.extend(
+        (
+            res.root,
+            res.status,
+            fmt(res.n_entities, "d"),
+            fmt(res.dwm_before, ".4f"),
+            fmt(res.dwm_after, ".4f"),
+            fmt(res.wall_s, ".2f"),
+            (res.error or "")[:60],
+        )
+        for res in results
+    )
+    widths = [max(len(row[col]) for row in rows) for col in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths, strict=True)).rstrip()
+        for row in rows
+    )
+
+
+def _run_batch_item(
+    root: str,
+    new_root: str,
+    config: RunConfig,
+    memory_limit: int | None,
+    conn: Connection,
+) -> None:
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    start = time.perf_counter()
+    instrumentation = Instrumentation(track_memory=False, capture={"merge_singles"})
+    try:
+        res = run_process(
+            IOWrapper(),
+            root,
+            new_root,
+            attrs.evolve(
+                batch_item_config(config, new_root),
+                instrumentation=instrumentation,
+            ),
+        )
+        if not res.is_ok():
+            raise res.error or RuntimeError(str(res))  # noqa: TRY301
+    except Exception as e:  # noqa: BLE001 - any failure is reported in the package's row
+        conn.send(BatchResult(root, "error", wall_s=time.perf_counter() - start, error=repr(e)))
+        return
+
+    adj_mat = instrumentation.outputs["merge_singles"]
+    conn.send(
+        BatchResult(
+            root,
+            "ok",
+            n_entities=len(adj_mat.node_map),
+            dwm_before=float(get_dwm(adj_mat, get_module_communities(adj_mat))),
+            dwm_after=float(get_dwm(adj_mat, adj_mat.communities)),
+            wall_s=time.perf_counter() - start,
+        ),
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="spaghettree")
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument("--process", dest="src_root", help="package to restructure")
+    targets.add_argument(
+        "--batch",
+        nargs="+",
+        default=None,
+        help="restructure several packages in parallel, each into its own directory of --out-dir",
+    )
+    parser.add_argument(
+        "--new-root",
+        default=None,
+        help="where to write the restructured package, defaults to overwriting the source",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=list(OPTIMISERS),
+        default="greedy",
+        help="algorithm used to optimise the communities",
+    )
+    parser.add_argument(
+        "--restarts",
+        type=int,
+        default=1,
+        help="run the engine this many times with different seeds, keeping the best result",
+    )
+    parser.add_argument(
+        "--use-hc",
+        dest="refiners",
+        action="append_const",
+        const="hc",
+        default=[],
+        help="hill climb from the optimised communities",
+    )
+    parser.add_argument(
+        "--use-sa",
+        dest="refiners",
+        action="append_const",
+        const="sa",
+        default=[],
+        help="anneal from the optimised communities",
+    )
+    parser.add_argument(
+        "--use-gen",
+        dest="refiners",
+        action="append_const",
+        const="gen",
+        default=[],
+        help="evolve the optimised communities with a genetic algorithm",
+    )
+    parser.add_argument(
+        "--max-iters",
+        type=int,
+        default=None,
+        help="maximum number of entity moves tried by the local searches",
+    )
+    parser.add_argument(
+        "--plateau",
+        type=int,
+        default=None,
+        help="stop a local search after this many moves without improving the score",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="seed for the optimisers")
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="seconds each local search may run for",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse the source files and run the optimisers",
+    )
+    parser.add_argument(
+        "--formatter",
+        choices=list(FORMATTERS),
+        default="ruff",
+        help="formatter run over the restructured files, black also sorts imports with isort",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="delete the python files under the new root that the restructured package left out",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="where to cache the parsed and formatted files, defaults to ~/.cache/spaghettree",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse and format every file from scratch",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="empty the parse and format caches before running",
+    )
+    parser.add_argument(
+        "--report",
+        default=None,
+        help=(
+            "json file the time, memory and sizes of each stage of the run are written to, "
+            "kept in each package's directory of --out-dir with --batch"
+        ),
+    )
+    parser.add_argument(
+        "--out-dir",
+        default="spaghettree_batch",
+        help="where --batch writes the restructured packages",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="seconds each --batch package may take before it is stopped",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=None,
+        help="MiB of address space each --batch package may use",
+    )
+    parser.add_argument(
+        "--batch-results",
+        default=None,
+        help="json file the --batch results table is written to",
+    )
+    parser.add_argument(
+        "--warm-start",
+        default=None,
+        help=(
+            "json file the final communities are saved to and read back from on the next run, "
+            "kept in each package's directory of --out-dir with --batch"
+        ),
+    )
+    return parser.parse_args(argv)
+
+
+def print_start(idx: int, result: StartResult) -> None:
+    print(f"start {idx}: {result}")  # noqa: T201
+
+
+def cli(argv: list[str] | None = None) -> Result:
+    args = parse_args(argv)
+
+    cache = format_cache = None
+    if not args.no_cache:
+        cache_dir = Path(args.cache_dir) if args.cache_dir else default_cache_dir()
+        cache = ParseCache(cache_dir)
+        format_cache = ParseCache(cache_dir / "formatted")
+        if args.clear_cache:
+            cache.clear()
+            format_cache.clear()
+
+    config = RunConfig(
+        engine=args.engine,
+        restarts=args.restarts,
+        refiners=args.refiners,
+        max_iters=args.max_iters,
+        plateau=args.plateau,
+        seed=args.seed,
+        time_budget=args.time_budget,
+        jobs=args.jobs,
+        cache=cache,
+        formatter=args.formatter,
+        format_cache=format_cache,
+        prune=args.prune,
+        partition_path=args.warm_start,
+        report_path=args.report,
+    )
+    if not args.batch:
+        res = main(args.src_root, args.new_root, attrs.evolve(config, on_start=print_start))
+        if res.is_ok():
+            print(f"files: {res.inner}")  # noqa: T201
+        return res
+
+    # the packages run in parallel so each one is parsed in a single process
+    results = run_batch(
+        args.batch,
+        args.out_dir,
+        attrs.evolve(config, jobs=1),
+        jobs=args.jobs,
+        timeout=args.timeout,
+        memory_limit=args.memory_limit * 2**20 if args.memory_limit else None,
+    )
+    print(format_batch_table(results))  # noqa: T201
+    if args.batch_results:
+        IOWrapper().write_json([attrs.asdict(res) for res in results], args.batch_results)
+    return Ok(results)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from ruff.__main__ import find_ruff_bin
+from tqdm import tqdm
+
+from spaghettree import safe
+from spaghettree.adapters.io_wrapper import format_code_str
+from spaghettree.domain.protocols import CacheProtocol
+
+# files sent to a worker at a time, and formatted by each ruff run
+FORMAT_CHUNK_SIZE = 16
+RUFF_CONFIG_FILES = (".ruff.toml", "ruff.toml", "pyproject.toml")
+
+
+def format_with_ruff(chunk: Sequence[tuple[str, str]]) -> list[str]:
+    """Fix and format a chunk of files with one `ruff check --fix` and one `ruff format`.
+
+    The files are written to a temporary directory that mirrors their layout under the ruff config
+    found above each path, with a copy of that config at its root, so ruff sees the project's
+    settings as if the files were already on disk.
+    """
+    ruff = find_ruff_bin()
+    with tempfile.TemporaryDirectory() as tmp:
+        roots: dict[Path | None, Path] = {}
+        tmp_paths = []
+        for path, code in chunk:
+            config = find_ruff_config(path)
+            if config not in roots:
+                roots[config] = Path(tmp, str(len(roots)))
+                if config is not None:
+                    roots[config].mkdir()
+                    shutil.copyfile(config, roots[config] / config.name)
+            project = config.parent if config is not None else Path(path).absolute().anchor
+            tmp_path = roots[config] / Path(path).absolute().relative_to(project)
+            tmp_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(code)
+            tmp_paths.append(tmp_path)
+
+        fix = [ruff, "check", "--fix", "--exit-zero", "--no-cache", "--extend-select", "I"]
+        subprocess.run([*fix, *tmp_paths], capture_output=True, check=True)  # noqa: S603
+        fmt = [ruff, "format", "--no-cache"]
+        subprocess.run([*fmt, *tmp_paths], capture_output=True, check=True)  # noqa: S603
+        return [tmp_path.read_text() for tmp_path in tmp_paths]
+
+
+def find_ruff_config(path: str) -> Path | None:
+    # the same files ruff looks for, nearest first, a pyproject.toml only counts with ruff settings
+    for parent in Path(path).absolute().parents:
+        for name in RUFF_CONFIG_FILES:
+            config = parent / name
+            if config.is_file() and (
+                name != "pyproject.toml" or "[tool.ruff" in config.read_text()
+            ):
+                return config
+    return None
+
+
+def format_with_black(chunk: Sequence[tuple[str, str]]) -> list[str]:
+    return [format_code_str(code) for _, code in chunk]
+
+
+def keep_format(chunk: Sequence[tuple[str, str]]) -> list[str]:
+    return [code for _, code in chunk]
+
+
+FORMATTERS: dict[str, Callable[[Sequence[tuple[str, str]]], list[str]]] = {
+    "ruff": format_with_ruff,
+    "black": format_with_black,
+    "none": keep_format,
+}
+FORMATTER_PACKAGES = {"ruff": ("ruff",), "black": ("black", "isort"), "none": ()}
+
+
+@safe
+def format_files(
+    src_code: dict[str, str],
+    *,
+    formatter: str = "ruff",
+    jobs: int = 1,
+    cache: CacheProtocol | None = None,
+) -> dict[str, str]:
+    """Format every file with one `formatter`, reusing cached results for unchanged code.
+
+    With `jobs` above 1 the files missing from the cache are formatted across processes.
+    """
+    key_prefix = formatter_key(formatter)
+    formatted: dict[str, str] = {}
+
+    if cache is not None:
+        for path, code in src_code.items():
+            # an unreadable entry is treated the same as a miss
+            cached_res = cache.get(f"{key_prefix}{path}", code)
+            if cached_res.is_ok() and cached_res.inner is not None:
+                formatted[path] = cached_res.inner
+
+    misses = [(path, code) for path, code in src_code.items() if path not in formatted]
+    format_chunk = partial(format_sources, formatter)
+    chunks = list(itertools.batched(misses, FORMAT_CHUNK_SIZE))
+
+    if jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            results = list(tqdm(executor.map(format_chunk, chunks), "formatting", len(chunks)))
+    else:
+        results = [format_chunk(chunk) for chunk in tqdm(chunks, "formatting")]
+
+    for (path, code), new_code in zip(misses, itertools.chain.from_iterable(results), strict=True):
+        formatted[path] = new_code
+        if cache is not None:
+            cache.put(f"{key_prefix}{path}", code, new_code)
+
+    if cache is not None:
+        cache.prune()
+
+    return {path: formatted[path] for path in src_code}
+
+
+def format_sources(formatter: str, chunk: tuple[tuple[str, str], ...]) -> list[str]:
+    return FORMATTERS[formatter](chunk)
+
+
+def formatter_key(formatter: str) -> str:
+    # the cache is keyed on the path and code, so the formatter and its version join the path
+    versions = []
+    for package in FORMATTER_PACKAGES[formatter]:
+        try:
+            versions.append(f"{package}={version(package)}")
+        except PackageNotFoundError:  # pragma: no cover
+            versions.append(f"{package}=unknown")
+    return f"{formatter}[{','.join(versions)}]:"
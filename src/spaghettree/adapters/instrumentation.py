@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import functools
+import math
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import attrs
+
+from spaghettree import Result
+from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.optimisation import get_dwm
+
+StageFunc = Callable[[Any], Result]
+
+
+@attrs.define(frozen=True)
+class StageRecord:
+    name: str = attrs.field()
+    ok: bool = attrs.field()
+    wall_s: float = attrs.field()
+    cpu_s: float = attrs.field()
+    peak_bytes: int | None = attrs.field()
+    input_size: int | None = attrs.field()
+    output_size: int | None = attrs.field()
+    score: float | None = attrs.field(default=None)
+
+
+@attrs.define
+class Instrumentation:
+    """Records the cost of each stage of `run_process`.
+
+    Each record holds the wall and CPU time, the peak memory traced by `tracemalloc` while the
+    stage ran, the size of its input and output, and for a stage returning an `AdjMat` the score
+    of its communities, so the records show what each optimiser gained. Each record is passed to
+    `callback` as soon as its stage finishes. CPU time only covers this process, not any worker
+    processes. The outputs of the stages named in `capture` are kept in `outputs`.
+    """
+
+    callback: Callable[[StageRecord], None] | None = attrs.field(default=None)
+    track_memory: bool = attrs.field(default=True)
+    capture: frozenset[str] = attrs.field(default=frozenset(), converter=frozenset)
+    records: list[StageRecord] = attrs.field(factory=list)
+    outputs: dict[str, Any] = attrs.field(factory=dict)
+
+    def stage(self, name: str, func: StageFunc) -> StageFunc:
+        @functools.wraps(func)
+        def wrapped(inp: Any) -> Result:  # noqa: ANN401
+            # only stop tracing afterwards when it was this stage that started it
+            started = self.track_memory and not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            if self.track_memory:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                res = func(inp)
+            finally:
+                wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+                peak = tracemalloc.get_traced_memory()[1] - base if self.track_memory else None
+                if started:
+                    tracemalloc.stop()
+
+            record = StageRecord(
+                name,
+                res.is_ok(),
+                wall,
+                cpu,
+                peak,
+                size_of(inp),
+                size_of(res.inner) if res.is_ok() else None,
+                score_of(res.inner) if res.is_ok() else None,
+            )
+            self.records.append(record)
+            if name in self.capture and res.is_ok():
+                self.outputs[name] = res.inner
+            if self.callback is not None:
+                self.callback(record)
+            return res
+
+        return wrapped
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "total_wall_s": sum(record.wall_s for record in self.records),
+            "total_cpu_s": sum(record.cpu_s for record in self.records),
+            "stages": [attrs.asdict(record) for record in self.records],
+        }
+
+
+def untracked(name: str, func: StageFunc) -> StageFunc:  # noqa: ARG001
+    """Stand in for `Instrumentation.stage` when nothing is being recorded."""
+    return func
+
+
+def size_of(obj: Any) -> int | None:  # noqa: ANN401
+    """The number of items in `obj`, or of nodes for an `AdjMat` or `CallGraph`."""
+    for attr in ("node_map", "symbols"):
+        if (nodes := getattr(obj, attr, None)) is not None:
+            return len(nodes)
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+def score_of(obj: Any) -> float | None:  # noqa: ANN401
+    """`get_dwm` of the communities of an `AdjMat`, or None for anything else or no edges."""
+    if not isinstance(obj, AdjMat):
+        return None
+    score = get_dwm(obj, obj.communities)
+    return None if math.isnan(score) else score
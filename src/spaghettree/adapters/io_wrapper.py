@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import glob
+import json
 import os
 import subprocess
+from collections.abc import Iterator
 from pathlib import Path
-from typing import Protocol, runtime_checkable
+from typing import Any, Protocol, runtime_checkable
 
 import attrs
 import black
@@ -25,17 +27,36 @@ class IOProtocol(Protocol):
     @safe
     def read_files(self, root: str | Path) -> Result: ...
 
+    def stream_files(self, root: str | Path) -> Result: ...
+
     @safe
     def write(self, modified_code: str, filepath: str, *, format_code: bool = True) -> None: ...
 
-    def write_files(self, src_code: dict[str, str], ruff_root: str | None = None) -> Result: ...
+    @safe
+    def read_json(self, path: str) -> Any: ...  # noqa: ANN401
+
+    @safe
+    def write_json(self, data: Any, filepath: str) -> None: ...  # noqa: ANN401
+
+    @safe
+    def delete(self, path: str) -> None: ...
+
+    def write_files(
+        self,
+        src_code: dict[str, str],
+        *,
+        format_code: bool = True,
+        prune_root: str | None = None,
+    ) -> Result: ...
 
 
 @attrs.define
 class IOWrapper:
     @safe
     def list_files(self, root: str | Path, *, recursive: bool = True) -> list[str]:
-        return glob.glob(f"{root}/**/**.py", recursive=recursive)
+        if not os.path.isdir(root):
+            raise FileNotFoundError(root)
+        return sorted(glob.glob(f"{root}/**/**.py", recursive=recursive))
 
     @safe
     def read(self, path: str) -> str:
@@ -60,38 +81,68 @@ class IOWrapper:
             return Err(fails)
         return Ok(results)
 
+    def stream_files(self, root: str | Path) -> Result:
+        """Like `read_files` but each file is only read as the iterator reaches it.
+
+        A file that can't be read raises from the iterator instead of returning an `Err`.
+        """
+        paths_res = self.list_files(root)
+        if not paths_res.is_ok():
+            return paths_res
+        return Ok(self._iter_files(paths_res.inner))
+
+    def _iter_files(self, paths: list[str]) -> Iterator[tuple[str, str]]:
+        for path in paths:
+            res = self.read(path)
+            if not res.is_ok():
+                raise res.error
+            yield path, res.inner
+
     @safe
     def write(self, modified_code: str, filepath: str, *, format_code: bool = True) -> None:
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         with open(filepath, "w") as f:
-            f.write(format_code_str(modified_code))
+            f.write(format_code_str(modified_code) if format_code else modified_code)
         if format_code:
             self._run_ruff(filepath)
 
-    def write_files(self, src_code: dict[str, str], ruff_root: str | None = None) -> Result:
-        results, fails = {}, {}
-
-        for filepath, modified_code in src_code.items():
-            if ruff_root is not None:
-                # format all at the end instead
-                res = self.write(modified_code, filepath, format_code=False)
-            else:
-                res = self.write(modified_code, filepath, format_code=True)
+    @safe
+    def read_json(self, path: str) -> Any:  # noqa: ANN401
+        with open(path) as f:
+            return json.load(f)
 
-            if res.is_ok():
-                results[filepath] = res.inner
-            else:
-                fails[filepath] = res
+    @safe
+    def write_json(self, data: Any, filepath: str) -> None:  # noqa: ANN401
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        with open(filepath, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
 
-        if ruff_root:
-            self._run_ruff(ruff_root)
+    @safe
+    def delete(self, path: str) -> None:
+        os.remove(path)
+
+    def write_files(
+        self,
+        src_code: dict[str, str],
+        *,
+        format_code: bool = True,
+        prune_root: str | None = None,
+    ) -> Result:
+        """Write the files whose content differs from what is on disk, see `write_changed`."""
+        summary, fails = write_changed(
+            self,
+            src_code,
+            format_code=format_code,
+            prune_root=prune_root,
+        )
         if fails:
             return Err(fails)
-        return Ok(results)
+        return Ok(summary)
 
-    def _run_ruff(self, path: str) -> None:
-        subprocess.run([find_ruff_bin(), "check", "--fix", str(path)], check=True)  # noqa: S603
-        subprocess.run([find_ruff_bin(), "format", str(path)], check=True)  # noqa: S603
+    def _run_ruff(self, *paths: str) -> None:
+        # diagnostics ruff can't fix are reported without failing the run
+        subprocess.run([find_ruff_bin(), "check", "--fix", "--exit-zero", *paths], check=True)  # noqa: S603
+        subprocess.run([find_ruff_bin(), "format", *paths], check=True)  # noqa: S603
 
 
 @attrs.define
@@ -100,6 +151,8 @@ class FakeIOWrapper:
 
     @safe
     def list_files(self, root: str | Path, *, recursive: bool = True) -> list[str]:
+        if not any(f.startswith(f"{str(root).rstrip('/')}/") for f in self.files):
+            raise FileNotFoundError(root)
         if recursive:
             return [f for f in self.files if f.startswith(root) and f.endswith(".py")]
         return [
@@ -128,25 +181,118 @@ class FakeIOWrapper:
             return Err(fails)
         return Ok(results)
 
+    def stream_files(self, root: str | Path) -> Result:
+        """Like `read_files` but each file is only read as the iterator reaches it.
+
+        A file that can't be read raises from the iterator instead of returning an `Err`.
+        """
+        paths_res = self.list_files(root)
+        if not paths_res.is_ok():
+            return paths_res
+        return Ok(self._iter_files(paths_res.inner))
+
+    def _iter_files(self, paths: list[str]) -> Iterator[tuple[str, str]]:
+        for path in paths:
+            res = self.read(path)
+            if not res.is_ok():
+                raise res.error
+            yield path, res.inner
+
     @safe
     def write(self, modified_code: str, filepath: str, *, format_code: bool = True) -> None:
         self.files[filepath] = format_code_str(modified_code) if format_code else modified_code
 
-    def write_files(self, src_code: dict[str, str], ruff_root: str | None = None) -> Result:
-        results, fails = {}, {}
+    @safe
+    def read_json(self, path: str) -> Any:  # noqa: ANN401
+        return json.loads(self.files[path])
+
+    @safe
+    def write_json(self, data: Any, filepath: str) -> None:  # noqa: ANN401
+        self.files[filepath] = json.dumps(data, indent=2, sort_keys=True)
+
+    @safe
+    def delete(self, path: str) -> None:
+        del self.files[path]
+
+    def write_files(
+        self,
+        src_code: dict[str, str],
+        *,
+        format_code: bool = True,
+        prune_root: str | None = None,
+    ) -> Result:
+        summary, fails = write_changed(
+            self,
+            src_code,
+            format_code=format_code,
+            prune_root=prune_root,
+        )
+        if fails:
+            return Err(fails)
+        return Ok(summary)
 
-        for filepath, modified_code in src_code.items():
-            if ruff_root is not None:
-                res = self.write(modified_code, filepath)
 
+@attrs.define
+class WriteSummary:
+    created: list[str] = attrs.field(factory=list)
+    changed: list[str] = attrs.field(factory=list)
+    unchanged: list[str] = attrs.field(factory=list)
+    deleted: list[str] = attrs.field(factory=list)
+
+    @property
+    def written(self) -> list[str]:
+        return [*self.created, *self.changed]
+
+    def counts(self) -> dict[str, int]:
+        return {name: len(paths) for name, paths in attrs.asdict(self).items()}
+
+    def __str__(self) -> str:
+        return ", ".join(f"{count} {name}" for name, count in self.counts().items())
+
+
+def write_changed(
+    io: IOProtocol,
+    src_code: dict[str, str],
+    *,
+    format_code: bool = True,
+    prune_root: str | None = None,
+) -> tuple[WriteSummary, dict[str, Result]]:
+    """Write each file unless it already holds exactly that code, so its mtime is left as is.
+
+    With `format_code` the files are formatted with isort and black before the comparison, and
+    nothing else formats them afterwards, so a second run finds them unchanged. With `prune_root`
+    every other python file under it is deleted.
+    """
+    summary, fails = WriteSummary(), {}
+
+    for filepath, modified_code in src_code.items():
+        code = format_code_str(modified_code) if format_code else modified_code
+        # a file that can't be read is written over, which fails if it can't be written either
+        existing_res = io.read(filepath)
+        if existing_res.is_ok() and existing_res.inner == code:
+            summary.unchanged.append(filepath)
+            continue
+
+        res = io.write(code, filepath, format_code=False)
+        if not res.is_ok():
+            fails[filepath] = res
+        elif existing_res.is_ok():
+            summary.changed.append(filepath)
+        else:
+            summary.created.append(filepath)
+
+    if prune_root is not None and (paths_res := io.list_files(prune_root)).is_ok():
+        kept = {os.path.normpath(path) for path in src_code}
+        for path in paths_res.inner:
+            if os.path.normpath(path) in kept:
+                continue
+            res = io.delete(path)
             if res.is_ok():
-                results[filepath] = res.inner
+                summary.deleted.append(path)
             else:
-                fails[filepath] = res
+                fails[path] = res
 
-        if fails:
-            return Err(fails)
-        return Ok(results)
+    return summary, fails
 
 
 def format_code_str(code: str) -> str:
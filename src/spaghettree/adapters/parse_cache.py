@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any
+
+import attrs
+
+from spaghettree import safe
+
+try:
+    TOOL_VERSION = version("spaghettree")
+except PackageNotFoundError:  # pragma: no cover
+    TOOL_VERSION = "unknown"
+
+# bump whenever the cached objects or the rules extracting them change, so older entries miss
+CACHE_FORMAT = 1
+
+
+def default_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(cache_home) / "spaghettree"
+
+
+def cache_key(path: str, code: str) -> str:
+    # the path is part of the key as the module name and entity locations are derived from it
+    digest = hashlib.sha256(f"{TOOL_VERSION}\0{CACHE_FORMAT}\0{path}\0".encode())
+    digest.update(code.encode())
+    return digest.hexdigest()
+
+
+@attrs.define
+class ParseCache:
+    """On disk cache of values derived from each source file, like the facts parsed out of it.
+
+    Entries are keyed by the file's path, content and the tool version. Reading an entry bumps its
+    mtime so `prune` can evict the least recently used entries once the cache outgrows `max_bytes`.
+    """
+
+    root: Path = attrs.field(factory=default_cache_dir, converter=Path)
+    max_bytes: int = attrs.field(default=2**28)
+
+    @safe
+    def get(self, path: str, code: str) -> Any:  # noqa: ANN401
+        entry = self._entry_path(path, code)
+        if not entry.exists():
+            return None
+        os.utime(entry)
+        with open(entry, "rb") as f:
+            return pickle.load(f)  # noqa: S301 - only ever holds entries written by `put`
+
+    @safe
+    def put(self, path: str, code: str, value: Any) -> None:  # noqa: ANN401
+        entry = self._entry_path(path, code)
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry)
+
+    @safe
+    def prune(self) -> int:
+        entries = sorted(
+            ((entry.stat(), entry) for entry in self.root.glob("*.pkl")),
+            key=lambda x: x[0].st_mtime,
+        )
+        total = sum(stat.st_size for stat, _ in entries)
+
+        evicted = 0
+        for stat, entry in entries:
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= stat.st_size
+            evicted += 1
+        return evicted
+
+    @safe
+    def clear(self) -> int:
+        entries = list(self.root.glob("*.pkl"))
+        for entry in entries:
+            entry.unlink(missing_ok=True)
+        return len(entries)
+
+    def _entry_path(self, path: str, code: str) -> Path:
+        return self.root / f"{cache_key(path, code)}.pkl"
+
+
+@attrs.define
+class FakeParseCache:
+    entries: dict = attrs.field(factory=dict)
+    max_entries: int | None = attrs.field(default=None)
+
+    @safe
+    def get(self, path: str, code: str) -> Any:  # noqa: ANN401
+        key = cache_key(path, code)
+        if key not in self.entries:
+            return None
+        # reinsert to mark the entry as the most recently used
+        self.entries[key] = self.entries.pop(key)
+        return self.entries[key]
+
+    @safe
+    def put(self, path: str, code: str, value: Any) -> None:  # noqa: ANN401
+        self.entries[cache_key(path, code)] = value
+
+    @safe
+    def prune(self) -> int:
+        evicted = 0
+        while self.max_entries is not None and len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+            evicted += 1
+        return evicted
+
+    @safe
+    def clear(self) -> int:
+        n_entries = len(self.entries)
+        self.entries.clear()
+        return n_entries
@@ -1,29 +1,221 @@
+import functools
 from typing import Self
 
 import attrs
 import numpy as np
+import numpy.typing as npt
 
-from spaghettree import safe
+from spaghettree import Result, safe
+from spaghettree.domain.symbols import SymbolTable
+
+# above this many bytes for the dense n x n matrix the sparse backend is used instead
+DENSE_MAX_BYTES = 2**28
+
+
+@attrs.define
+class SparseMat:
+    """Compressed sparse row matrix that only stores the nonzero call counts."""
+
+    indptr: np.ndarray = attrs.field()
+    indices: np.ndarray = attrs.field()
+    data: np.ndarray = attrs.field()
+    shape: tuple[int, int] = attrs.field()
+
+    @classmethod
+    def from_edges(
+        cls,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        n: int,
+        dtype: npt.DTypeLike = np.int32,
+    ) -> Self:
+        # repeated (row, col) pairs are summed into a single entry
+        keys, counts = np.unique(rows.astype(np.int64) * n + cols, return_counts=True)
+        uniq_rows, uniq_cols = np.divmod(keys, n)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(uniq_rows, minlength=n), out=indptr[1:])
+        return cls(indptr, uniq_cols.astype(np.int64), counts.astype(dtype), (n, n))
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.data.dtype
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    def nonzero(self) -> tuple[np.ndarray, np.ndarray]:
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        return rows, self.indices
+
+    def sum(self, axis: int | None = None) -> np.ndarray | int:
+        if axis is None:
+            return self.data.sum()
+        rows, cols = self.nonzero()
+        idxs = cols if axis == 0 else rows
+        totals = np.bincount(idxs, weights=self.data, minlength=self.shape[axis])
+        return totals.astype(np.promote_types(self.dtype, np.int64))
+
+    def toarray(self) -> np.ndarray:
+        mat = np.zeros(self.shape, dtype=self.dtype)
+        rows, cols = self.nonzero()
+        mat[rows, cols] = self.data
+        return mat
+
+
+@attrs.define
+class CommunityLabels:
+    """Disjoint set of the nodes in each community, keyed by the community's label.
+
+    Merging two communities links their roots rather than relabelling every member, so a merge
+    is near constant time and the per node labels are only flattened when `to_list` is called.
+    """
+
+    parent: list[int] = attrs.field()
+    size: list[int] = attrs.field()
+    root_labels: dict[int, int] = attrs.field()
+    label_roots: dict[int, int] = attrs.field()
+
+    @classmethod
+    def from_list(cls, communities: list[int]) -> Self:
+        parent = list(range(len(communities)))
+        size = [1] * len(communities)
+        label_roots: dict[int, int] = {}
+
+        for idx, label in enumerate(communities):
+            if (root := label_roots.setdefault(label, idx)) != idx:
+                parent[idx] = root
+                size[root] += 1
+
+        root_labels = {root: label for label, root in label_roots.items()}
+        return cls(parent, size, root_labels, label_roots)
+
+    def find(self, node: int) -> int:
+        parent = self.parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    def label_of(self, node: int) -> int:
+        return self.root_labels[self.find(node)]
+
+    def merge(self, keep: int, absorb: int) -> None:
+        """Move every node labelled `absorb` into the community labelled `keep`."""
+        if keep == absorb or absorb not in self.label_roots:
+            return
+        absorb_root = self.label_roots.pop(absorb)
+        del self.root_labels[absorb_root]
+
+        if keep not in self.label_roots:
+            self.label_roots[keep] = absorb_root
+            self.root_labels[absorb_root] = keep
+            return
+
+        keep_root = self.label_roots[keep]
+        if self.size[keep_root] < self.size[absorb_root]:
+            keep_root, absorb_root = absorb_root, keep_root
+            del self.root_labels[absorb_root]
+
+        self.parent[absorb_root] = keep_root
+        self.size[keep_root] += self.size[absorb_root]
+        self.label_roots[keep] = keep_root
+        self.root_labels[keep_root] = keep
+
+    def to_list(self) -> list[int]:
+        return [self.label_of(node) for node in range(len(self.parent))]
+
+
+@attrs.define
+class CallGraph:
+    """Every call between entities as a pair of integer ids into `symbols`."""
+
+    symbols: SymbolTable = attrs.field()
+    callers: np.ndarray = attrs.field()
+    callees: np.ndarray = attrs.field()
+
+    @classmethod
+    def from_call_tree(cls, call_tree: dict[str, list[str]]) -> Self:
+        symbols = SymbolTable.from_names(call_tree)
+        ids = symbols.ids
+        n_edges = sum(len(called) for called in call_tree.values())
+
+        callers = np.fromiter(
+            (ids[caller] for caller, called in call_tree.items() for _ in called),
+            dtype=np.int64,
+            count=n_edges,
+        )
+        callees = np.fromiter(
+            (ids[call] for called in call_tree.values() for call in called),
+            dtype=np.int64,
+            count=n_edges,
+        )
+        return cls(symbols, callers, callees)
 
 
 @attrs.define
 class AdjMat:
-    mat: np.ndarray = attrs.field()
-    node_map: dict[int, str] = attrs.field()
+    mat: np.ndarray | SparseMat = attrs.field()
+    node_map: SymbolTable = attrs.field(converter=SymbolTable.from_node_map)
     communities: list[int] = attrs.field()
 
+    @classmethod
+    def from_call_tree(
+        cls,
+        call_tree: dict[str, list[str]],
+        *,
+        dtype: npt.DTypeLike = np.int32,
+        sparse: bool | None = None,
+    ) -> Result:
+        return safe(CallGraph.from_call_tree)(call_tree).and_then(
+            functools.partial(cls.from_call_graph, dtype=dtype, sparse=sparse),
+        )
+
     @classmethod
     @safe
-    def from_call_tree(cls, call_tree: dict[str, list[str]]) -> Self:
-        ent_idx: dict[str, int] = {node: i for i, node in enumerate(call_tree)}
-        node_map: dict[int, str] = {idx: ent_name for ent_name, idx in ent_idx.items()}
-        n = len(ent_idx)
-        adj_mat = np.zeros((n, n), dtype=int)
-
-        for caller, called in call_tree.items():
-            for call in called:
-                src_idx = ent_idx[caller]
-                dst_idx = ent_idx[call]
-                adj_mat[src_idx, dst_idx] += 1
-
-        return cls(adj_mat, node_map, list(node_map.keys()))
+    def from_call_graph(
+        cls,
+        graph: CallGraph,
+        *,
+        dtype: npt.DTypeLike = np.int32,
+        sparse: bool | None = None,
+    ) -> Self:
+        n = len(graph.symbols)
+        if sparse is None:
+            sparse = n * n * np.dtype(dtype).itemsize > DENSE_MAX_BYTES
+
+        if sparse:
+            adj_mat = SparseMat.from_edges(graph.callers, graph.callees, n, dtype)
+        else:
+            adj_mat = np.zeros((n, n), dtype=dtype)
+            np.add.at(adj_mat, (graph.callers, graph.callees), 1)
+
+        return cls(adj_mat, graph.symbols, list(range(n)))
+
+    @property
+    def is_sparse(self) -> bool:
+        return isinstance(self.mat, SparseMat)
+
+    @functools.cached_property
+    def edges(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The source, destination and weight of every nonzero entry in row order."""
+        if isinstance(self.mat, SparseMat):
+            rows, cols = self.mat.nonzero()
+            return rows, cols, self.mat.data
+        rows, cols = np.nonzero(self.mat)
+        return rows, cols, self.mat[rows, cols]
+
+    @functools.cached_property
+    def out_degree(self) -> np.ndarray:
+        return self.mat.sum(axis=1)
+
+    @functools.cached_property
+    def in_degree(self) -> np.ndarray:
+        return self.mat.sum(axis=0)
+
+    @functools.cached_property
+    def total_edges(self) -> int:
+        return int(self.out_degree.sum())
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import math
+import random
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable
+from typing import Self
+
+import attrs
+
+from spaghettree import safe
+from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.optimisation import CLOCK_EVERY
+from spaghettree.domain.partition import Partition, WeightedGraph, to_node_labels
+
+# proposals are node moves apart from these fractions of community merges and splits
+MERGE_RATE = 0.05
+SPLIT_RATE = 0.05
+# fraction of node moves proposing a new community of the node's own
+ISOLATE_RATE = 0.02
+
+Proposal = tuple[float, Callable[[], None]]
+
+
+@safe
+def optimise_communities_sa(  # noqa: PLR0913
+    adj_mat: AdjMat,
+    *,
+    max_iters: int | None = None,
+    plateau: int | None = None,
+    seed: int | None = None,
+    time_budget: float | None = None,
+    final_temp_ratio: float = 1e-3,
+) -> AdjMat:
+    """Simulated annealing of `get_dwm` over node moves and community merges and splits.
+
+    Every proposal is scored incrementally from the per community degree sums. The temperature
+    starts where a typical worsening node move is accepted half the time and cools geometrically
+    to `final_temp_ratio` of that over `max_iters` proposals or `time_budget` seconds, whichever
+    runs out first, stopping early after `plateau` proposals without a new best. Without either
+    limit `max_iters` defaults to 200 proposals per node. Returns the best communities seen.
+    """
+    graph = WeightedGraph.from_adj_mat(adj_mat)
+    if not graph.total_edges or max_iters == 0:
+        return adj_mat
+
+    if max_iters is None and time_budget is None:
+        max_iters = 200 * graph.n_nodes
+
+    state = AnnealingState.from_labels(graph, to_node_labels(adj_mat.communities), seed)
+    labels = anneal(
+        state,
+        max_iters=max_iters,
+        plateau=plateau,
+        time_budget=time_budget,
+        final_temp_ratio=final_temp_ratio,
+    )
+
+    return attrs.evolve(adj_mat, communities=to_node_labels(labels))
+
+
+def anneal(
+    state: AnnealingState,
+    *,
+    max_iters: int | None = None,
+    plateau: int | None = None,
+    time_budget: float | None = None,
+    final_temp_ratio: float = 1e-3,
+) -> list[int]:
+    """Run the annealing schedule on `state`, returning the best labels seen."""
+    if max_iters == 0:
+        return state.partition.labels
+    rng = state.rng
+    start = time.perf_counter()
+    initial_temp = state.initial_temperature()
+    log_ratio = math.log(final_temp_ratio)
+
+    score, best_score = 0.0, 0.0
+    best_labels: list[int] | None = None
+    iters, since_best, progress = 0, 0, 0.0
+
+    while progress < 1 and (plateau is None or since_best < plateau):
+        if not iters % CLOCK_EVERY:
+            progress = iters / max_iters if max_iters is not None else 0.0
+            if time_budget is not None:
+                progress = max(progress, (time.perf_counter() - start) / time_budget)
+            temp = initial_temp * math.exp(log_ratio * min(progress, 1.0))
+            if progress >= 1:
+                break
+        iters += 1
+        since_best += 1
+
+        if (proposal := state.propose()) is None:
+            continue
+        gain, apply = proposal
+        if gain < 0 and rng.random() >= math.exp(gain / temp):
+            continue
+
+        # the best labels are only copied when leaving them for a worse state
+        if gain < 0 and best_labels is None:
+            best_labels = state.partition.labels.copy()
+        apply()
+        score += gain
+        if score > best_score:
+            best_score, best_labels, since_best = score, None, 0
+
+    return best_labels or state.partition.labels
+
+
+@attrs.define
+class AnnealingState:
+    """A `Partition` with the members of each community, which merges and splits need."""
+
+    partition: Partition = attrs.field()
+    members: defaultdict[int, set[int]] = attrs.field()
+    rng: random.Random = attrs.field()
+    nbr_lists: list[list[int]] = attrs.field()
+
+    @classmethod
+    def from_labels(cls, graph: WeightedGraph, labels: list[int], seed: int | None = None) -> Self:
+        members: defaultdict[int, set[int]] = defaultdict(set)
+        for node, label in enumerate(labels):
+            members[label].add(node)
+        return cls(
+            Partition.from_labels(graph, labels),
+            members,
+            random.Random(seed),  # noqa: S311
+            [list(nbrs) for nbrs in graph.nbrs],
+        )
+
+    def move(self, node: int, target: int) -> None:
+        current = self.partition.labels[node]
+        self.partition.move(node, target)
+        self.members[current].discard(node)
+        if not self.members[current]:
+            del self.members[current]
+        self.members[target].add(node)
+
+    def propose(self) -> Proposal | None:
+        kind = self.rng.random()
+        if kind < MERGE_RATE:
+            return self.propose_merge()
+        if kind < MERGE_RATE + SPLIT_RATE:
+            return self.propose_split()
+        return self.propose_move()
+
+    def propose_move(self) -> Proposal | None:
+        partition, rng = self.partition, self.rng
+        node = rng.randrange(len(self.nbr_lists))
+        if not (nbrs := self.nbr_lists[node]):
+            return None
+
+        if rng.random() < ISOLATE_RATE:
+            if partition.comm_size[partition.labels[node]] == 1:
+                return None
+            target = partition.empty_label()
+        else:
+            target = partition.labels[rng.choice(nbrs)]
+            if target == partition.labels[node]:
+                return None
+
+        gain = partition.move_gain(node, target, partition.neighbour_weights(node))
+        return gain, lambda: self.move(node, target)
+
+    def propose_merge(self) -> Proposal | None:
+        partition, rng = self.partition, self.rng
+        node = rng.randrange(len(self.nbr_lists))
+        if not (nbrs := self.nbr_lists[node]):
+            return None
+
+        keep, absorb = partition.labels[node], partition.labels[rng.choice(nbrs)]
+        if keep == absorb:
+            return None
+        if partition.comm_size[absorb] > partition.comm_size[keep]:
+            keep, absorb = absorb, keep
+
+        m = partition.graph.total_edges
+        weight = self.weight_to(self.members[absorb], keep)
+        expected = (
+            partition.comm_in[keep] * partition.comm_out[absorb]
+            + partition.comm_in[absorb] * partition.comm_out[keep]
+        )
+        gain = weight / m - expected / m**2
+
+        def apply() -> None:
+            for member in list(self.members[absorb]):
+                self.move(member, keep)
+
+        return gain, apply
+
+    def propose_split(self) -> Proposal | None:
+        partition, rng = self.partition, self.rng
+        node = rng.randrange(len(self.nbr_lists))
+        comm = partition.labels[node]
+        if (size := partition.comm_size[comm]) < 2:  # noqa: PLR2004
+            return None
+
+        # grow a connected part of the community out from `node`
+        split = self.grow(node, comm, rng.randrange(1, size))
+        graph = partition.graph
+        m = graph.total_edges
+        split_in = sum(graph.in_degree[member] for member in split)
+        split_out = sum(graph.out_degree[member] for member in split)
+        rest_in, rest_out = partition.comm_in[comm] - split_in, partition.comm_out[comm] - split_out
+
+        weight = self.weight_to(split, comm) - 2 * self.weight_within(split)
+        gain = -weight / m + (split_in * rest_out + rest_in * split_out) / m**2
+
+        def apply() -> None:
+            target = partition.empty_label()
+            for member in split:
+                self.move(member, target)
+
+        return gain, apply
+
+    def initial_temperature(self, n_samples: int = 1000) -> float:
+        """A temperature accepting the median worsening node move half the time."""
+        worse = sorted(
+            gain
+            for _ in range(n_samples)
+            if (proposal := self.propose_move()) is not None and (gain := proposal[0]) < 0
+        )
+        if not worse:
+            return 1 / self.partition.graph.total_edges
+        return -worse[len(worse) // 2] / math.log(2)
+
+    def grow(self, node: int, comm: int, size: int) -> set[int]:
+        labels, nbrs = self.partition.labels, self.partition.graph.nbrs
+        grown, queue = {node}, deque([node])
+        while queue and len(grown) < size:
+            for nbr in nbrs[queue.popleft()]:
+                if labels[nbr] == comm and nbr not in grown:
+                    grown.add(nbr)
+                    queue.append(nbr)
+                    if len(grown) == size:
+                        break
+        return grown
+
+    def weight_to(self, nodes: set[int], comm: int) -> float:
+        """Combined weight between `nodes` and the members of `comm`."""
+        labels, nbrs = self.partition.labels, self.partition.graph.nbrs
+        return sum(
+            weight for node in nodes for nbr, weight in nbrs[node].items() if labels[nbr] == comm
+        )
+
+    def weight_within(self, nodes: set[int]) -> float:
+        nbrs = self.partition.graph.nbrs
+        return (
+            sum(weight for node in nodes for nbr, weight in nbrs[node].items() if nbr in nodes) / 2
+        )
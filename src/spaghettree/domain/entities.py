@@ -1,71 +1,102 @@
 from __future__ import annotations
 
-from collections.abc import Collection
+from collections.abc import Collection, Iterable, Iterator
 from typing import Self
 
 import attrs
 import libcst as cst
 from attrs.validators import instance_of
 
-from spaghettree.domain.globals import GlobalCST, GlobalVisitor
-from spaghettree.domain.imports import ImportCST, ImportType, ImportVisitor
+from spaghettree.domain.globals import GlobalCST
+from spaghettree.domain.imports import ImportCST, ImportType
+from spaghettree.domain.visitors import EntityLocation, ModuleVisitor
+
+
+def cst_to_str(node: cst.CSTNode) -> str:
+    return cst.Module([]).code_for_node(node)
 
 
 @attrs.define
 class ModuleCST:
     name: str = attrs.field(validator=instance_of(str))
-    tree: cst.Module = attrs.field(validator=[instance_of(cst.Module)], repr=False)
-    func_trees: dict[str, cst.FunctionDef] = attrs.field(default=None, repr=False)
-    class_trees: dict[str, cst.ClassDef] = attrs.field(default=None, repr=False)
     funcs: list[FuncCST] = attrs.field(factory=list)
     classes: list[ClassCST] = attrs.field(factory=list)
     global_vars: list[GlobalCST] = attrs.field(factory=list)
-    imports: list[ImportCST] = attrs.field(default=None, repr=False)
-
-    def __attrs_post_init__(self) -> None:
-        iv = ImportVisitor()
-        cst.Module(
-            [
-                node
-                for node in self.tree.children
-                if isinstance(node, cst.SimpleStatementLine)
-                and isinstance(node.body[0], (cst.ImportFrom, cst.Import))
-            ],
-        ).visit(iv)
-        self.imports = iv.imports
-
-        self.func_trees = {
-            f"{self.name}.{node.name.value}": node
-            for node in self.tree.children
-            if isinstance(node, cst.FunctionDef)
-        }
-        self.class_trees = {
-            f"{self.name}.{node.name.value}": node
-            for node in self.tree.children
-            if isinstance(node, cst.ClassDef)
-        }
-
-        self.global_vars = [
-            GlobalCST(
-                name=f"{self.name}.{target.target.value if isinstance(target.target, cst.Name) else target.target.attr.value}",
-                tree=stmt,
+    imports: list[ImportCST] = attrs.field(factory=list, repr=False)
+    locations: list[EntityLocation] = attrs.field(factory=list, repr=False)
+
+    @classmethod
+    def from_tree(cls, name: str, tree: cst.Module, path: str = "") -> Self:
+        """Extract the module's entities from its tree, keeping only their code and facts.
+
+        The tree is traversed once by a `ModuleVisitor`, and each top level statement is turned
+        back into code once, which also gives the line each entity is defined at. None of the
+        returned objects hold on to the tree, so they are cheap to pickle.
+        """
+        visitor = ModuleVisitor()
+        tree.visit(visitor)
+        statements = {id(stmt): (code, line_no) for stmt, code, line_no in top_level_code(tree)}
+
+        funcs = [
+            FuncCST(f"{name}.{func_name}", statements[id(func.node)][0], func.calls)
+            for func_name, func in visitor.funcs.items()
+        ]
+        classes = [
+            ClassCST(
+                f"{name}.{cls_name}",
+                statements[id(cls_.node)][0],
+                [
+                    FuncCST(
+                        f"{name}.{cls_name}.{meth.node.name.value}",
+                        cst_to_str(meth.node),
+                        meth.calls,
+                    )
+                    for meth in cls_.methods.values()
+                ],
             )
-            for stmt in self.tree.body
-            if isinstance(stmt, cst.SimpleStatementLine)
-            for assign in stmt.body
-            if isinstance(assign, (cst.Assign, cst.AnnAssign))
-            for target in (assign.targets if isinstance(assign, cst.Assign) else [assign])
-            if isinstance(target.target if isinstance(assign, cst.Assign) else target, cst.Name)
+            for cls_name, cls_ in visitor.classes.items()
+        ]
+
+        global_vars = [
+            GlobalCST(name=f"{name}.{gbl_name}", code=statements[id(stmt)][0])
+            for gbl_name, stmt in visitor.global_vars
         ]
-        visitor = GlobalVisitor(self.name, self.global_vars)
-        self.tree.visit(visitor)
-        self.global_vars = [gbl for gbl in self.global_vars if not gbl.name.endswith(".__all__")]
+        module_globals = {gbl.name.rpartition(".")[2]: gbl for gbl in global_vars}
+        for gbl_name, referenced_by in visitor.references:
+            module_globals[gbl_name].referenced.append(f"{name}.{referenced_by}")
+
+        definitions = [
+            *((func_name, func.node) for func_name, func in visitor.funcs.items()),
+            *((cls_name, cls_.node) for cls_name, cls_ in visitor.classes.items()),
+            *visitor.global_vars,
+        ]
+        locations = [
+            EntityLocation(path, def_name, statements[id(node)][1])
+            for def_name, node in definitions
+        ]
+        global_vars = [gbl for gbl in global_vars if not gbl.name.endswith(".__all__")]
+
+        return cls(name, funcs, classes, global_vars, visitor.imports, locations)
+
+
+def top_level_code(tree: cst.Module) -> Iterator[tuple[cst.BaseStatement, str, int]]:
+    """Each top level statement of `tree`, its code and the line its definition is at."""
+    line_no = len(tree.header) + 1
+    for stmt in tree.body:
+        code = cst_to_str(stmt)
+        start = line_no + len(stmt.leading_lines)
+        if isinstance(stmt, (cst.FunctionDef, cst.ClassDef)):
+            # a definition is at the line of its `def` or `class`, after any decorators
+            decorators = "".join(cst_to_str(dec) for dec in stmt.decorators)
+            start += decorators.count("\n") + len(stmt.lines_after_decorators)
+        yield stmt, code, start
+        line_no += code.count("\n")
 
 
 @attrs.define
 class ClassCST:
     name: str = attrs.field(validator=[instance_of(str)])
-    tree: cst.ClassDef = attrs.field(validator=[instance_of(cst.ClassDef)], repr=False)
+    code: str = attrs.field(validator=[instance_of(str)], repr=False)
     methods: list[FuncCST] = attrs.field(validator=[instance_of(list)])
     imports: list[ImportCST] = attrs.field(default=None, repr=False)
 
@@ -73,24 +104,22 @@ class ClassCST:
         return [call for meth in self.methods for call in meth.calls]
 
     def filter_native_calls(self, entities: Collection[str]) -> Self:
-        for meth in self.methods:
-            meth.calls = [call for call in meth.calls if call in entities]
-        return self
+        return attrs.evolve(
+            self,
+            methods=[meth.filter_native_calls(entities) for meth in self.methods],
+        )
 
     def resolve_native_imports(self) -> Self:
-        for method in self.methods:
-            for call in method.calls:
-                call_parts = call.split(".")
-                mod_name = ".".join(call_parts[:-1])
-                call_name = call_parts[-1]
-                self.imports.append(ImportCST(mod_name, ImportType.FROM, call_name, call_name))
-        return self
+        return attrs.evolve(
+            self,
+            imports=with_native_imports(self.imports or [], self.get_call_tree_entries()),
+        )
 
 
 @attrs.define
 class FuncCST:
     name: str = attrs.field(validator=[instance_of(str)])
-    tree: cst.FunctionDef = attrs.field(validator=[instance_of(cst.FunctionDef)], repr=False)
+    code: str = attrs.field(validator=[instance_of(str)], repr=False)
     calls: list[str] = attrs.field(validator=[instance_of(list)])
     imports: list[ImportCST] = attrs.field(default=None, repr=False)
 
@@ -98,13 +127,16 @@ class FuncCST:
         return self.calls
 
     def filter_native_calls(self, entities: Collection[str]) -> Self:
-        self.calls = [call for call in self.calls if call in entities]
-        return self
+        return attrs.evolve(self, calls=[call for call in self.calls if call in entities])
 
     def resolve_native_imports(self) -> Self:
-        for call in self.calls:
-            call_parts = call.split(".")
-            mod_name = ".".join(call_parts[:-1])
-            call_name = call_parts[-1]
-            self.imports.append(ImportCST(mod_name, ImportType.FROM, call_name, call_name))
-        return self
+        return attrs.evolve(self, imports=with_native_imports(self.imports or [], self.calls))
+
+
+def with_native_imports(imports: list[ImportCST], calls: Iterable[str]) -> list[ImportCST]:
+    """`imports` plus a from import of each called entity, without duplicates."""
+    native = (
+        ImportCST(mod_name, ImportType.FROM, call_name, call_name)
+        for mod_name, _, call_name in (call.rpartition(".") for call in calls)
+    )
+    return list(dict.fromkeys([*imports, *native]))
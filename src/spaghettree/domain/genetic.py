@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import TracebackType
+from typing import Self
+
+import attrs
+import numpy as np
+
+from spaghettree import safe
+from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.shared_arrays import SharedArrays
+
+# fraction of the nodes moved to a neighbour's community when mutating a child
+MUTATION_RATE = 0.01
+# chance a child also has one community merged into a neighbouring one
+MERGE_RATE = 0.1
+TOURNAMENT_SIZE = 3
+
+# the graph and population the worker processes score, attached once per worker
+_WORKER_ARRAYS: SharedArrays | None = None
+
+
+@safe
+def optimise_communities_gen(  # noqa: PLR0913
+    adj_mat: AdjMat,
+    *,
+    max_iters: int | None = None,
+    plateau: int | None = None,
+    seed: int | None = None,
+    time_budget: float | None = None,
+    population_size: int = 32,
+    n_elite: int = 2,
+    jobs: int = 1,
+) -> AdjMat:
+    """Genetic algorithm over partitions encoded as arrays of node index labels.
+
+    Starts from mutations of the current communities. Each generation keeps the `n_elite` best
+    and breeds the rest by tournament selection, crossing over whole communities of the second
+    parent into the first and mutating the children. Runs for `max_iters` generations or
+    `time_budget` seconds, stopping early after `plateau` generations without a new best, with
+    `max_iters` defaulting to 100 without either limit. With `jobs` above 1 the population is
+    scored across processes that read the graph and population from shared memory.
+    """
+    if not 0 <= n_elite < population_size:
+        msg = f"n_elite must be at least 0 and below population_size {population_size}: {n_elite}"
+        raise ValueError(msg)
+
+    if not adj_mat.total_edges:
+        return adj_mat
+
+    if max_iters is None and time_budget is None:
+        max_iters = 100
+
+    rng = np.random.default_rng(seed)
+    rows, cols, weights = adj_mat.edges
+    graph = {
+        "rows": rows.astype(np.int32),
+        "cols": cols.astype(np.int32),
+        "weights": weights.astype(np.float64),
+        "in_degree": adj_mat.in_degree.astype(np.float64),
+        "out_degree": adj_mat.out_degree.astype(np.float64),
+    }
+    start = time.perf_counter()
+
+    population = np.repeat(
+        canonical_labels(np.asarray(adj_mat.communities, dtype=np.int32)[None, :]),
+        population_size,
+        axis=0,
+    )
+    population[1:] = mutate(population[1:], graph["rows"], graph["cols"], rng)
+
+    with PopulationScorer(graph, population.shape, jobs) as scorer:
+        scores = scorer.score(population)
+        generation, since_best, best_score = 0, 0, scores.max()
+
+        while (max_iters is None or generation < max_iters) and (
+            plateau is None or since_best < plateau
+        ):
+            if time_budget is not None and time.perf_counter() - start >= time_budget:
+                break
+
+            elite = population[np.argsort(-scores, kind="stable")[:n_elite]]
+            n_children = population_size - len(elite)
+            children = crossover(
+                population[tournament(scores, n_children, rng)],
+                population[tournament(scores, n_children, rng)],
+                rng,
+            )
+            population = np.concatenate(
+                [elite, mutate(children, graph["rows"], graph["cols"], rng)],
+            )
+            scores = scorer.score(population)
+
+            generation += 1
+            since_best += 1
+            if scores.max() > best_score:
+                best_score, since_best = scores.max(), 0
+
+    return attrs.evolve(adj_mat, communities=population[np.argmax(scores)].tolist())
+
+
+def batch_dwm(  # noqa: PLR0913
+    population: np.ndarray,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    weights: np.ndarray,
+    in_degree: np.ndarray,
+    out_degree: np.ndarray,
+) -> np.ndarray:
+    """`get_dwm` of every row of `population`, whose labels must all be below the node count."""
+    k, n = population.shape
+    m = weights.sum()
+
+    internal = (population[:, rows] == population[:, cols]) @ weights
+
+    # offset each row's labels so one bincount sums the degrees of every row's communities
+    flat = (population + np.arange(k)[:, None] * n).ravel()
+    comm_in = np.bincount(flat, np.tile(in_degree, k), minlength=k * n)
+    comm_out = np.bincount(flat, np.tile(out_degree, k), minlength=k * n)
+    expected = (comm_in * comm_out).reshape(k, n).sum(axis=1)
+
+    return internal / m - expected / m**2
+
+
+def canonical_labels(population: np.ndarray) -> np.ndarray:
+    """Relabel each community in each row by its lowest node index."""
+    k, n = population.shape
+    if not k:
+        return population
+    flat = population.astype(np.int64) - population.min(axis=1, keepdims=True)
+    span = int(flat.max()) + 1
+    flat += np.arange(k)[:, None] * span
+
+    lowest = np.full(k * span, n, dtype=np.int32)
+    np.minimum.at(lowest, flat.ravel(), np.tile(np.arange(n, dtype=np.int32), k))
+    return lowest[flat]
+
+
+def tournament(scores: np.ndarray, n_winners: int, rng: np.random.Generator) -> np.ndarray:
+    entrants = rng.integers(len(scores), size=(n_winners, TOURNAMENT_SIZE))
+    return entrants[np.arange(n_winners), np.argmax(scores[entrants], axis=1)]
+
+
+def crossover(first: np.ndarray, second: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Copy a random half of the second parents' communities whole into the first parents."""
+    k, n = first.shape
+    chosen = rng.random((k, n)) < 0.5  # noqa: PLR2004
+    from_second = chosen[np.arange(k)[:, None], second]
+    # the copied communities are offset so they never join one of the first parent's
+    return canonical_labels(np.where(from_second, second + n, first))
+
+
+def mutate(
+    population: np.ndarray,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Move random nodes to a neighbour's community and merge the odd pair of communities."""
+    k, n = population.shape
+    population = population.copy()
+    row_idxs = np.arange(k)[:, None]
+
+    edges = rng.integers(len(rows), size=(k, max(1, int(n * MUTATION_RATE))))
+    flip = rng.random(edges.shape) < 0.5  # noqa: PLR2004
+    moved = np.where(flip, rows[edges], cols[edges])
+    joined = np.where(flip, cols[edges], rows[edges])
+    population[row_idxs, moved] = population[row_idxs, joined]
+
+    for idx in np.flatnonzero(rng.random(k) < MERGE_RATE):
+        edge = rng.integers(len(rows))
+        labels = population[idx]
+        labels[labels == labels[rows[edge]]] = labels[cols[edge]]
+
+    return canonical_labels(population)
+
+
+@attrs.define
+class PopulationScorer:
+    """Scores populations with `batch_dwm`, split across `jobs` processes when above 1."""
+
+    graph: dict[str, np.ndarray] = attrs.field()
+    shape: tuple[int, int] = attrs.field()
+    jobs: int = attrs.field(default=1)
+    shared: SharedArrays | None = attrs.field(default=None, init=False)
+    executor: ProcessPoolExecutor | None = attrs.field(default=None, init=False)
+
+    def __enter__(self) -> Self:
+        if self.jobs > 1:
+            population = np.zeros(self.shape, dtype=np.int32)
+            self.shared = SharedArrays.create({**self.graph, "population": population})
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.jobs,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_attach_worker,
+                initargs=(self.shared.spec,),
+            )
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.shared is not None:
+            self.shared.close(unlink=True)
+
+    def score(self, population: np.ndarray) -> np.ndarray:
+        if self.executor is None or self.shared is None:
+            return batch_dwm(population, **self.graph)
+
+        # workers read the population from shared memory so only the row ranges are sent
+        self.shared.arrays["population"][...] = population
+        bounds = np.linspace(0, len(population), self.jobs + 1).astype(int).tolist()
+        return np.concatenate(list(self.executor.map(_score_rows, bounds[:-1], bounds[1:])))
+
+
+def _attach_worker(spec: dict[str, tuple[str, tuple[int, ...], str]]) -> None:
+    global _WORKER_ARRAYS  # noqa: PLW0603
+    _WORKER_ARRAYS = SharedArrays.attach(spec)
+
+
+def _score_rows(start: int, stop: int) -> np.ndarray:
+    if _WORKER_ARRAYS is None:
+        msg = "worker was not attached to the shared arrays"
+        raise RuntimeError(msg)
+    arrays = dict(_WORKER_ARRAYS.arrays)
+    population = arrays.pop("population")
+    return batch_dwm(population[start:stop], **arrays)
@@ -4,7 +4,6 @@ from collections.abc import Collection
 from typing import Self
 
 import attrs
-import libcst as cst
 
 from spaghettree.domain.imports import ImportCST
 
@@ -12,7 +11,7 @@ from spaghettree.domain.imports import ImportCST
 @attrs.define(eq=True)
 class GlobalCST:
     name: str = attrs.field()
-    tree: cst.SimpleStatementLine = attrs.field(repr=False)
+    code: str = attrs.field(repr=False)
     referenced: list[str] = attrs.field(factory=list)
     imports: list[ImportCST] = attrs.field(factory=list)
 
@@ -20,31 +19,7 @@ class GlobalCST:
         return self.referenced
 
     def filter_native_calls(self, entities: Collection[str]) -> Self:
-        self.referenced = [ref for ref in self.referenced if ref in entities]
-        return self
+        return attrs.evolve(self, referenced=[ref for ref in self.referenced if ref in entities])
 
     def resolve_native_imports(self) -> Self:
         return self
-
-
-@attrs.define
-class GlobalVisitor(cst.CSTVisitor):
-    module_name: str
-    global_vars: list[GlobalCST]
-    module_globals: dict[str, GlobalCST] = attrs.field(default=None)
-    current_func: str | None = attrs.field(default=None)
-
-    def __attrs_post_init__(self) -> None:
-        self.module_globals = {gbl.name.split(".")[-1]: gbl for gbl in self.global_vars}
-
-    def visit_FunctionDef(self, node: cst.FunctionDef) -> None:  # noqa: N802
-        self.current_func = node.name.value
-
-    def leave_FunctionDef(self, _: cst.FunctionDef) -> None:  # noqa: N802
-        self.current_func = None
-
-    def visit_Name(self, node: cst.Name) -> None:  # noqa: N802
-        if self.current_func and node.value in self.module_globals:
-            self.module_globals[node.value].referenced.append(
-                f"{self.module_name}.{self.current_func}",
-            )
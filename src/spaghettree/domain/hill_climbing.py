@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import math
+import time
+
+import attrs
+import numpy as np
+
+from spaghettree import safe
+from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.optimisation import CLOCK_EVERY, MIN_GAIN
+from spaghettree.domain.partition import Partition, WeightedGraph, shuffled_nodes, to_node_labels
+
+
+@safe
+def optimise_communities_hc(
+    adj_mat: AdjMat,
+    *,
+    max_iters: int | None = None,
+    plateau: int | None = None,
+    seed: int | None = None,
+    time_budget: float | None = None,
+) -> AdjMat:
+    """Hill climb `get_dwm` by moving single entities between communities.
+
+    Each iteration visits one node, moving it to the neighbouring community, or a new community
+    of its own, with the best gain. Stops after `max_iters` visits or once `plateau` visits in a
+    row have not improved the score, which defaults to a full pass over the nodes, i.e. a local
+    optimum, or after `time_budget` seconds. A `seed` shuffles the order nodes are visited in.
+    """
+    graph = WeightedGraph.from_adj_mat(adj_mat)
+    if not graph.total_edges:
+        return adj_mat
+
+    rng = np.random.default_rng(seed) if seed is not None else None
+    partition = Partition.from_labels(graph, to_node_labels(adj_mat.communities))
+    hill_climb(
+        partition,
+        rng,
+        max_iters=max_iters,
+        plateau=plateau or graph.n_nodes,
+        time_budget=time_budget,
+    )
+
+    return attrs.evolve(adj_mat, communities=to_node_labels(partition.labels))
+
+
+def hill_climb(
+    partition: Partition,
+    rng: np.random.Generator | None = None,
+    *,
+    max_iters: int | None = None,
+    plateau: int,
+    time_budget: float | None = None,
+) -> int:
+    """Sweep over the nodes making improving moves, returning the number of iterations run."""
+    deadline = time.perf_counter() + time_budget if time_budget is not None else math.inf
+    iters, since_improved = 0, 0
+
+    while since_improved < plateau and (max_iters is None or iters < max_iters):
+        for node in shuffled_nodes(partition.graph.n_nodes, rng):
+            best, gain = partition.best_move(node, isolate=True)
+            if gain > MIN_GAIN:
+                partition.move(node, best)
+                since_improved = 0
+            else:
+                since_improved += 1
+
+            iters += 1
+            if since_improved >= plateau or iters == max_iters:
+                break
+            if not iters % CLOCK_EVERY and time.perf_counter() >= deadline:
+                return iters
+
+    return iters
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import re
+from collections.abc import Iterable
 from enum import Enum, auto
 
 import attrs
-import libcst as cst
 from attrs.validators import instance_of
 
+# identifiers anywhere in the code, strings and comments included, so no used import is missed
+NAME_PATTERN = re.compile(r"[^\W\d]\w*")
+
 
 class ImportType(Enum):
     FROM = auto()
@@ -19,6 +23,14 @@ class ImportCST:
     name: str = attrs.field(validator=[instance_of(str)])
     as_name: str = attrs.field(validator=[instance_of(str)])
 
+    @property
+    def bound_name(self) -> str:
+        """The name the import binds in the importing module."""
+        if self.import_type is ImportType.IMPORT and self.name == self.as_name:
+            # `import a.b` binds `a`, with `b` reached as an attribute of it
+            return self.name.partition(".")[0]
+        return self.as_name
+
     def to_str(self) -> str:
         output: list[str] = []
         if self.import_type is ImportType.FROM:
@@ -31,43 +43,16 @@ class ImportCST:
         return " ".join(output) + "\n"
 
 
-@attrs.define
-class ImportVisitor(cst.CSTVisitor):
-    imports: list[ImportCST] = attrs.field(factory=list)
-
-    def visit_Import(self, node: cst.Import) -> None:  # noqa: N802
-        for alias in node.names:
-            name = self._resolve_attr(alias.name)
-            asname = alias.asname.name.value if alias.asname else name
-            self._add_import(name, ImportType.IMPORT, name, asname)
-
-    def visit_ImportFrom(self, node: cst.ImportFrom) -> None:  # noqa: N802
-        module = self._resolve_attr(node.module)
-        if module is None:
-            return  # skip relative imports
-
-        if isinstance(node.names, cst.ImportStar):
-            self._add_import(module, ImportType.FROM, "*", "*")
-            return
-
-        aliases = node.names
-        if isinstance(aliases, cst.ImportAlias):
-            aliases = [aliases]
-
-        for alias in aliases:
-            name = self._resolve_attr(alias.name)
-            asname = alias.asname.name.value if alias.asname else name
-            self._add_import(module, ImportType.FROM, name, asname)
-
-    def _add_import(self, key: str, import_type: ImportType, name: str, as_name: str) -> None:
-        self.imports.append(ImportCST(key, import_type, name, as_name))
+def used_imports(imports: Iterable[ImportCST], code: str) -> list[ImportCST]:
+    """The distinct `imports` whose bound name appears in `code`.
 
-    def _resolve_attr(self, node: cst.BaseExpression | None) -> str | None:
-        if node is None:
-            return None
-        if isinstance(node, cst.Name):
-            return node.value
-        if isinstance(node, cst.Attribute):
-            parent = self._resolve_attr(node.value)
-            return f"{parent}.{node.attr.value}" if parent else node.attr.value
-        return None
+    Star and `__future__` imports bind no name the code mentions, so they are always kept.
+    """
+    names = set(NAME_PATTERN.findall(code))
+    return list(
+        dict.fromkeys(
+            imp
+            for imp in imports
+            if imp.bound_name in names or imp.name == "*" or imp.module == "__future__"
+        ),
+    )
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from collections import defaultdict, deque
+
+import attrs
+import numpy as np
+
+from spaghettree import safe
+from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.optimisation import MIN_GAIN
+from spaghettree.domain.partition import (
+    Partition,
+    WeightedGraph,
+    shuffled_nodes,
+    to_node_labels,
+)
+
+
+@safe
+def optimise_communities_louvain(
+    adj_mat: AdjMat,
+    *,
+    refine: bool = True,
+    max_levels: int = 32,
+    seed: int | None = None,
+) -> AdjMat:
+    """Multilevel optimisation of `get_dwm`, moving single nodes then aggregating communities.
+
+    Starts from the current communities. With `refine` each community is split into well
+    connected sub communities before aggregating, as in Leiden, so no community ends up
+    disconnected. A `seed` shuffles the order nodes are visited in.
+    """
+    rng = np.random.default_rng(seed) if seed is not None else None
+
+    graph = WeightedGraph.from_adj_mat(adj_mat)
+    if not graph.total_edges:
+        return adj_mat
+
+    labels = to_node_labels(adj_mat.communities)
+    # the node of the current level's graph that each original node has been aggregated into
+    membership = list(range(graph.n_nodes))
+
+    for _ in range(max_levels):
+        partition = Partition.from_labels(graph, labels)
+        move_nodes(partition, rng)
+        labels = partition.labels
+
+        refined = refine_partition(partition) if refine else labels
+        if len(set(refined)) == graph.n_nodes:
+            break
+
+        graph, node_map = graph.aggregate(refined)
+        membership = [node_map[node] for node in membership]
+
+        # each super node starts in the community its members were moved into
+        super_labels = [0] * graph.n_nodes
+        for node, super_node in enumerate(node_map):
+            super_labels[super_node] = labels[node]
+        labels = super_labels
+
+    communities = to_node_labels([labels[node] for node in membership])
+    return attrs.evolve(adj_mat, communities=communities)
+
+
+def move_nodes(partition: Partition, rng: np.random.Generator | None = None) -> int:
+    """Greedily move nodes to the neighbouring community with the best gain until none improve.
+
+    Only the neighbours of a moved node are revisited, as in Leiden's fast local moving.
+    """
+    nbrs = partition.graph.nbrs
+    queue = deque(shuffled_nodes(partition.graph.n_nodes, rng))
+    queued = [True] * partition.graph.n_nodes
+    n_moves = 0
+
+    while queue:
+        node = queue.popleft()
+        queued[node] = False
+
+        best, gain = partition.best_move(node)
+        if gain <= MIN_GAIN:
+            continue
+
+        partition.move(node, best)
+        n_moves += 1
+        for nbr in nbrs[node]:
+            if not queued[nbr] and partition.labels[nbr] != best:
+                queue.append(nbr)
+                queued[nbr] = True
+
+    return n_moves
+
+
+def refine_partition(partition: Partition) -> list[int]:
+    """Leiden's refinement, greedily merging well connected nodes within each community.
+
+    Every node starts as a singleton, a singleton only joins a sub community of its own
+    community when both are well connected to the rest of that community and the merge does not
+    lower the score, so the sub communities are always connected.
+    """
+    graph, labels = partition.graph, partition.labels
+    m = graph.total_edges
+    refined = Partition.from_labels(graph, list(range(graph.n_nodes)))
+
+    # combined weight between each sub community and the rest of its community
+    external = [
+        sum(weight for nbr, weight in graph.nbrs[node].items() if labels[nbr] == labels[node])
+        for node in range(graph.n_nodes)
+    ]
+
+    def is_well_connected(weight: float, k_in: float, k_out: float, comm: int) -> bool:
+        rest_in = partition.comm_in[comm] - k_in
+        rest_out = partition.comm_out[comm] - k_out
+        return weight >= (k_out * rest_in + k_in * rest_out) / m
+
+    members: defaultdict[int, list[int]] = defaultdict(list)
+    for node, label in enumerate(labels):
+        members[label].append(node)
+
+    for comm, nodes in members.items():
+        for node in nodes:
+            is_singleton = refined.labels[node] == node and refined.comm_size[node] == 1
+            if not is_singleton or not is_well_connected(
+                external[node], graph.in_degree[node], graph.out_degree[node], comm
+            ):
+                continue
+
+            nbr_weights = {
+                sub: weight
+                for sub, weight in refined.neighbour_weights(node).items()
+                if labels[sub] == comm
+            }
+            best, best_gain = node, 0.0
+            for sub in nbr_weights:
+                if not is_well_connected(
+                    external[sub], refined.comm_in[sub], refined.comm_out[sub], comm
+                ):
+                    continue
+                if (gain := refined.move_gain(node, sub, nbr_weights)) >= best_gain:
+                    best, best_gain = sub, gain
+
+            if best != node:
+                external[best] += external[node] - 2 * nbr_weights[best]
+                refined.move(node, best)
+
+    return refined.labels
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+import attrs
+import numpy as np
+
+from spaghettree import Result, safe
+from spaghettree.domain.adj_mat import AdjMat, SparseMat
+from spaghettree.domain.optimisation import get_dwm
+from spaghettree.domain.shared_arrays import SharedArrays
+
+# the matrix and optimiser the worker processes run starts with, attached once per worker
+_WORKER_STATE: tuple[SharedArrays, AdjMat, Callable[..., Result]] | None = None
+
+
+@attrs.define(frozen=True)
+class StartResult:
+    seed: int | None = attrs.field()
+    score: float = attrs.field()
+    runtime: float = attrs.field()
+    communities: list[int] = attrs.field(repr=False)
+
+
+@safe
+def optimise_multi_start(  # noqa: PLR0913
+    adj_mat: AdjMat,
+    optimiser: Callable[..., Result],
+    *,
+    restarts: int,
+    jobs: int = 1,
+    seed: int | None = None,
+    on_start: Callable[[int, StartResult], None] | None = None,
+) -> AdjMat:
+    """Run `optimiser` from the current communities `restarts` times, keeping the best result.
+
+    The first start is unseeded, the optimiser's default, and the others are seeded with `seed`
+    onwards so each takes a different path. With `jobs` above 1 the starts run across processes
+    that read the adjacency matrix from shared memory. Ties go to the earliest start. Each start's
+    index and result are passed to `on_start` once all of them have finished.
+    """
+    first_seed = seed or 0
+    seeds = [None, *range(first_seed, first_seed + restarts - 1)]
+
+    if jobs > 1 and restarts > 1:
+        shared = SharedArrays.create(adj_mat_arrays(adj_mat))
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(jobs, restarts),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_attach_worker,
+                initargs=(shared.spec, adj_mat.node_map, adj_mat.communities, optimiser),
+            ) as executor:
+                results = list(executor.map(_run_start, seeds))
+        finally:
+            shared.close(unlink=True)
+    else:
+        results = [run_start(adj_mat, optimiser, start_seed) for start_seed in seeds]
+
+    if on_start is not None:
+        for idx, result in enumerate(results):
+            on_start(idx, result)
+
+    best = max(results, key=lambda result: result.score)
+    return attrs.evolve(adj_mat, communities=best.communities)
+
+
+def run_start(
+    adj_mat: AdjMat,
+    optimiser: Callable[..., Result],
+    seed: int | None,
+) -> StartResult:
+    start = time.perf_counter()
+    # optimisers may set the communities in place so each start gets its own `AdjMat`
+    res = optimiser(attrs.evolve(adj_mat), seed=seed)
+    if not res.is_ok():
+        raise res.error
+    communities = list(res.inner.communities)
+    return StartResult(
+        seed,
+        get_dwm(adj_mat, communities),
+        time.perf_counter() - start,
+        communities,
+    )
+
+
+def adj_mat_arrays(adj_mat: AdjMat) -> dict[str, np.ndarray]:
+    if isinstance(adj_mat.mat, SparseMat):
+        return {
+            "indptr": adj_mat.mat.indptr,
+            "indices": adj_mat.mat.indices,
+            "data": adj_mat.mat.data,
+        }
+    return {"mat": adj_mat.mat}
+
+
+def _attach_worker(
+    spec: dict[str, tuple[str, tuple[int, ...], str]],
+    node_map: dict[int, str],
+    communities: list[int],
+    optimiser: Callable[..., Result],
+) -> None:
+    global _WORKER_STATE  # noqa: PLW0603
+    shared = SharedArrays.attach(spec)
+    arrays = shared.arrays
+    for arr in arrays.values():
+        arr.flags.writeable = False
+
+    if "mat" in arrays:
+        mat: np.ndarray | SparseMat = arrays["mat"]
+    else:
+        n = len(node_map)
+        mat = SparseMat(arrays["indptr"], arrays["indices"], arrays["data"], (n, n))
+    _WORKER_STATE = (shared, AdjMat(mat, node_map, communities), optimiser)
+
+
+def _run_start(seed: int | None) -> StartResult:
+    if _WORKER_STATE is None:
+        msg = "worker was not attached to the shared adjacency matrix"
+        raise RuntimeError(msg)
+    _, adj_mat, optimiser = _WORKER_STATE
+    return run_start(adj_mat, optimiser, seed)
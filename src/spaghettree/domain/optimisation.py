@@ -1,40 +1,56 @@
+import heapq
 from collections import defaultdict
+from typing import Self
 
 import attrs
 import numpy as np
 
 from spaghettree import safe
-from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.adj_mat import AdjMat, CommunityLabels
+
+# how far a seeded run may scale each merge's gain when ordering the merges of a round
+GAIN_JITTER = 0.1
+# gains below this are treated as float noise so the local moves always terminate
+MIN_GAIN = 1e-12
+# the local searches only read the clock every this many moves or proposals
+CLOCK_EVERY = 1024
 
 
 @safe
-def optimise_communities(adj_mat: AdjMat) -> AdjMat:
-    valid_merges = get_merge_pairs(adj_mat)
-    print(f"{get_dwm(adj_mat.mat, adj_mat.communities) = }")  # noqa: T201
+def optimise_communities(adj_mat: AdjMat, *, seed: int | None = None) -> AdjMat:
+    """Greedily apply the best non overlapping merges of connected communities until none gain.
+
+    A `seed` randomly scales each gain when ordering the merges of a round, which also breaks
+    ties randomly, so runs with different seeds can reach different local optima.
+    """
+    rng = np.random.default_rng(seed) if seed is not None else None
+    graph = CommunityGraph.from_adj_mat(adj_mat)
+    valid_merges = get_merge_pairs(graph)
     while valid_merges:
-        to_merge = remove_overlapping_pairs(valid_merges)
-        adj_mat.communities = apply_merges(adj_mat.communities, to_merge)
-        valid_merges = get_merge_pairs(adj_mat)
-    print(f"{get_dwm(adj_mat.mat, adj_mat.communities) = }")  # noqa: T201
+        for pair in remove_overlapping_pairs(valid_merges, rng):
+            graph.merge(pair.c1, pair.c2)
+        valid_merges = get_merge_pairs(graph)
+    adj_mat.communities = graph.labels.to_list()
     return adj_mat
 
 
 @safe
 def merge_single_entity_communities_if_no_gain_penalty(adj_mat: AdjMat) -> AdjMat:
     communities = np.array(adj_mat.communities)
-    base_score = get_dwm(adj_mat.mat, communities)
+    base_score = get_dwm(adj_mat, communities)
 
-    grouped: defaultdict[int, list[tuple[int, str]]] = defaultdict(list)
+    modules = adj_mat.node_map.modules
+    grouped: defaultdict[int, list[int]] = defaultdict(list)
 
-    for idx, ent_name in adj_mat.node_map.items():
-        grouped[communities[idx]].append((idx, ent_name))
+    for idx in range(len(modules)):
+        grouped[communities[idx]].append(idx)
 
     updated, min_for_dir = {}, {}
 
     for comm, items in grouped.items():
         if len(items) == 1:
-            num, name = items[0]
-            dirname = ".".join(name.split(".")[:-1])
+            num = items[0]
+            dirname = modules[num]
             min_for_dir[dirname] = min(num, min_for_dir.get(dirname, num))
             updated[comm] = min_for_dir[dirname]
 
@@ -43,7 +59,7 @@ def merge_single_entity_communities_if_no_gain_penalty(adj_mat: AdjMat) -> AdjMa
     for c2, c1 in updated.items():
         merged_communities = communities.copy()
         merged_communities[merged_communities == c2] = c1
-        score = get_dwm(adj_mat.mat, merged_communities)
+        score = get_dwm(adj_mat, merged_communities)
 
         if gain := (score - base_score) >= 0:
             merge_pairs.append(PossibleMerge(c1, c2, gain))
@@ -52,38 +68,154 @@ def merge_single_entity_communities_if_no_gain_penalty(adj_mat: AdjMat) -> AdjMa
     return adj_mat
 
 
-@attrs.define(eq=True, frozen=True)
-class PossibleMerge:
-    c1: int = attrs.field()
-    c2: int = attrs.field()
-    gain: float = attrs.field()
+@safe
+def warm_start_communities(adj_mat: AdjMat, partition: dict[str, int] | None) -> AdjMat:
+    """Start from the communities of a previous run's `partition`, keyed by entity name.
 
+    Each previous community is labelled by its lowest current node index, entities that are new
+    since the previous run start as singletons and entities that have been removed are dropped.
+    """
+    if not partition:
+        return adj_mat
 
-def get_merge_pairs(adj_mat: AdjMat) -> list[PossibleMerge]:
-    communities = np.array(adj_mat.communities)
-    unique_comms = np.unique(communities)
-    base_score = get_dwm(adj_mat.mat, communities)
+    prev_labels: dict[int, int] = {}
+    communities = []
+
+    for idx, ent_name in adj_mat.node_map.items():
+        if (prev_comm := partition.get(ent_name)) is None:
+            communities.append(idx)
+        else:
+            communities.append(prev_labels.setdefault(prev_comm, idx))
 
-    merge_scores = []
+    return attrs.evolve(adj_mat, communities=communities)
 
-    for i, c1 in enumerate(unique_comms):
-        for c2 in unique_comms[i + 1 :]:
-            merged_communities = communities.copy()
 
-            merged_communities[merged_communities == c2] = c1
-            score = get_dwm(adj_mat.mat, merged_communities)
-            gain = score - base_score
-            if gain > 0:
-                merge_scores.append(PossibleMerge(c1, c2, gain))
-    return merge_scores
+def get_partition(adj_mat: AdjMat) -> dict[str, int]:
+    return {adj_mat.node_map[idx]: int(comm) for idx, comm in enumerate(adj_mat.communities)}
 
 
-def remove_overlapping_pairs(pairs: list[PossibleMerge]) -> list[PossibleMerge]:
-    pairs = sorted(pairs, key=lambda x: x.gain, reverse=True)
+def get_module_communities(adj_mat: AdjMat) -> list[int]:
+    """The communities of the entities as laid out in their current modules."""
+    labels: dict[str, int] = {}
+    return [labels.setdefault(module, idx) for idx, module in enumerate(adj_mat.node_map.modules)]
+
+
+@attrs.define(eq=True, frozen=True)
+class PossibleMerge:
+    c1: int = attrs.field()
+    c2: int = attrs.field()
+    gain: float = attrs.field()
+
+
+@attrs.define
+class CommunityGraph:
+    """Community level view of an `AdjMat` that is updated in place as communities merge.
+
+    `links` holds the combined weight of the edges in both directions between two connected
+    communities, `internal` the weight of the edges inside each community and
+    `in_degree` / `out_degree` the summed degrees of each community's members, which is all
+    that is needed to score a merge without touching the node level matrix.
+    """
+
+    links: dict[int, dict[int, int]] = attrs.field()
+    internal: dict[int, int] = attrs.field()
+    in_degree: dict[int, int] = attrs.field()
+    out_degree: dict[int, int] = attrs.field()
+    labels: CommunityLabels = attrs.field()
+    total_edges: int = attrs.field()
+
+    @classmethod
+    def from_adj_mat(cls, adj_mat: AdjMat) -> Self:
+        communities = np.asarray(adj_mat.communities)
+
+        links: defaultdict[int, defaultdict[int, int]] = defaultdict(lambda: defaultdict(int))
+        internal: defaultdict[int, int] = defaultdict(int)
+        in_degree: defaultdict[int, int] = defaultdict(int)
+        out_degree: defaultdict[int, int] = defaultdict(int)
+
+        for idx, comm in enumerate(communities.tolist()):
+            in_degree[comm] += int(adj_mat.in_degree[idx])
+            out_degree[comm] += int(adj_mat.out_degree[idx])
+
+        rows, cols, weights = adj_mat.edges
+        for src, dst, weight in zip(
+            communities[rows].tolist(),
+            communities[cols].tolist(),
+            weights.tolist(),
+            strict=True,
+        ):
+            if src == dst:
+                internal[src] += weight
+            else:
+                links[src][dst] += weight
+                links[dst][src] += weight
+
+        return cls(
+            links={comm: dict(nbrs) for comm, nbrs in links.items()},
+            internal=dict(internal),
+            in_degree=dict(in_degree),
+            out_degree=dict(out_degree),
+            labels=CommunityLabels.from_list(adj_mat.communities),
+            total_edges=adj_mat.total_edges,
+        )
+
+    def merge_gain(self, c1: int, c2: int) -> float:
+        if not self.total_edges:
+            return 0.0
+        weight = self.links.get(c1, {}).get(c2, 0)
+        expected = (
+            self.in_degree[c1] * self.out_degree[c2] + self.in_degree[c2] * self.out_degree[c1]
+        )
+        return (weight * self.total_edges - expected) / self.total_edges**2
+
+    def merge(self, c1: int, c2: int) -> None:
+        """Fold `c2` into `c1`, only touching the communities connected to `c2`."""
+        c2_links = self.links.pop(c2, {})
+        c1_links = self.links.setdefault(c1, {})
+        self.internal[c1] = (
+            self.internal.get(c1, 0) + self.internal.pop(c2, 0) + c2_links.pop(c1, 0)
+        )
+        c1_links.pop(c2, None)
+
+        for nbr, weight in c2_links.items():
+            nbr_links = self.links[nbr]
+            del nbr_links[c2]
+            c1_links[nbr] = c1_links.get(nbr, 0) + weight
+            nbr_links[c1] = nbr_links.get(c1, 0) + weight
+
+        self.in_degree[c1] += self.in_degree.pop(c2)
+        self.out_degree[c1] += self.out_degree.pop(c2)
+        self.labels.merge(c1, c2)
+
+
+def get_merge_pairs(graph: CommunityGraph) -> list[PossibleMerge]:
+    # merging communities with no edges between them can never increase the score
+    return [
+        PossibleMerge(c1, c2, gain)
+        for c1, nbrs in graph.links.items()
+        for c2 in nbrs
+        if c1 < c2 and (gain := graph.merge_gain(c1, c2)) > 0
+    ]
+
+
+def remove_overlapping_pairs(
+    pairs: list[PossibleMerge],
+    rng: np.random.Generator | None = None,
+) -> list[PossibleMerge]:
+    # ties are broken on the community labels, matching a stable sort of the pairs in label order
+    queue = [(-pair.gain, pair.c1, pair.c2, pair) for pair in pairs]
+    if rng is not None:
+        jitter = (1 + GAIN_JITTER * rng.random(len(pairs))).tolist()
+        queue = [
+            (-pair.gain * scale, pair.c1, pair.c2, pair)
+            for pair, scale in zip(pairs, jitter, strict=True)
+        ]
+    heapq.heapify(queue)
 
     selected, seen = [], set()
 
-    for pair in pairs:
+    while queue:
+        *_, pair = heapq.heappop(queue)
         if pair.c1 not in seen and pair.c2 not in seen:
             selected.append(pair)
             seen.add(pair.c1)
@@ -92,21 +224,28 @@ def remove_overlapping_pairs(pairs: list[PossibleMerge]) -> list[PossibleMerge]:
 
 
 def apply_merges(communities: list[int], pairs: list[PossibleMerge]) -> list[int]:
-    communities = np.array(communities)
+    labels = CommunityLabels.from_list(communities)
 
     for pair in pairs:
-        communities[communities == pair.c2] = pair.c1
-    return communities.tolist()
+        labels.merge(pair.c1, pair.c2)
+    return labels.to_list()
+
 
+def get_dwm(adj_mat: AdjMat, communities: list[int] | np.ndarray) -> float:
+    """Directed modularity of `communities`, scored from per community sums in O(E + n).
 
-def get_dwm(mat: np.ndarray, communities: list[int]) -> float:
-    out_degree = mat.sum(axis=0)
-    in_degree = mat.sum(axis=1)
-    total_edges = out_degree.sum()
+    Summing the expected matrix over the members of a community factorises into the product of
+    the community's summed in and out degrees, so neither it nor the community mask is built.
+    """
+    total_edges = adj_mat.total_edges
+    if not total_edges:
+        return float("nan")
 
-    communities = np.array(communities)
-    community_mat = communities[:, None] == communities[None, :]
+    communities = np.asarray(communities)
+    rows, cols, weights = adj_mat.edges
+    observed = weights[communities[rows] == communities[cols]].sum()
 
-    expected_matrix = np.outer(out_degree, in_degree) / total_edges
-    modularity_matrix = (mat - expected_matrix) * community_mat
-    return modularity_matrix.sum() / total_edges
+    comm_in = np.bincount(communities, weights=adj_mat.in_degree)
+    comm_out = np.bincount(communities, weights=adj_mat.out_degree)
+    expected = (comm_in @ comm_out) / total_edges
+    return float((observed - expected) / total_edges)
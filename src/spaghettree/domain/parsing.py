@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import copy
 import itertools
-from copy import deepcopy
+import multiprocessing
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
 
 import attrs
 import libcst as cst
@@ -9,118 +13,149 @@ import numpy as np
 from tqdm import tqdm
 
 from spaghettree import safe
-from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.adj_mat import AdjMat, CallGraph, CommunityLabels
 from spaghettree.domain.entities import ClassCST, FuncCST, GlobalCST, ModuleCST
-from spaghettree.domain.visitors import CallVisitor, LocationVisitor
+from spaghettree.domain.imports import used_imports
+from spaghettree.domain.protocols import CacheProtocol
+from spaghettree.domain.symbol_index import SymbolIndex, SymbolNode
+from spaghettree.domain.visitors import EntityLocation
 
 EntityCST = FuncCST | ClassCST | GlobalCST
 
+# files sent to a worker at a time, and chunks queued per worker before waiting on the oldest
+PARSE_CHUNK_SIZE = 8
+PENDING_PER_JOB = 4
+
 
 def str_to_cst(code: str) -> cst.Module:
     return cst.parse_module(code)
 
 
-def cst_to_str(node: cst.CSTNode) -> str:
-    return cst.Module([]).code_for_node(node)
+def get_module_name(path: str) -> str:
+    return path.split("src")[-1].replace("/", ".").removesuffix(".py").strip(".")
 
 
-@safe
-def create_module_cst_objs(src_code: dict[str, str]) -> dict[str, ModuleCST]:
-    def get_module_name(path: str) -> str:
-        return path.split("src")[-1].replace("/", ".").removesuffix(".py").strip(".")
+def parse_module_cst(path: str, code: str) -> ModuleCST:
+    return ModuleCST.from_tree(get_module_name(path), str_to_cst(code), path)
 
-    def get_func_cst(parent_name: str, tree: cst.FunctionDef) -> FuncCST:
-        cv = CallVisitor()
-        tree.visit(cv)
-        return FuncCST(f"{parent_name}.{tree.name.value}", tree, cv.calls)
 
+@safe
+def create_module_cst_objs(
+    src_code: dict[str, str] | Iterable[tuple[str, str]],
+    *,
+    jobs: int = 1,
+    cache: CacheProtocol | None = None,
+) -> dict[str, ModuleCST]:
+    """Parse every `(path, code)` pair, keeping only the extracted `ModuleCST` of each file.
+
+    The pairs can come from an iterator that reads the files lazily. Each source is dropped once
+    its file is parsed, and no more than `PENDING_PER_JOB` chunks per job wait in the pool, so
+    only a bounded number of sources are held in memory at once.
+    """
+    sources = src_code.items() if isinstance(src_code, dict) else src_code
+    # cache hits and parsed modules arrive out of order, so the file order is kept separately
+    paths: list[str] = []
     modules: dict[str, ModuleCST] = {}
 
-    for path, data in tqdm(src_code.items(), "creating objects"):
-        tree = str_to_cst(data)
-        module = ModuleCST(get_module_name(path), tree)
-
-        module.funcs = [get_func_cst(module.name, tree) for tree in module.func_trees.values()]
-
-        module.classes = [
-            ClassCST(
-                name,
-                tree,
-                [
-                    get_func_cst(name, f)
-                    for f in tree.body.children
-                    if isinstance(f, cst.FunctionDef)
-                ],
-            )
-            for name, tree in module.class_trees.items()
-        ]
-
-        modules[module.name] = module
-    return modules
-
-
-@attrs.define(frozen=True, eq=True, order=True)
-class EntityLocation:
-    path: str = attrs.field()
-    name: str = attrs.field(eq=False)
-    line_no: int = attrs.field()
+    def misses() -> Iterator[tuple[str, str]]:
+        for path, code in sources:
+            paths.append(path)
+            cached_res = cache.get(path, code) if cache is not None else None
+            # an unreadable entry is treated the same as a miss
+            if cached_res is not None and cached_res.is_ok() and cached_res.inner is not None:
+                modules[path] = cached_res.inner
+            else:
+                yield path, code
+
+    to_parse: Iterable[tuple[str, str]] = misses()
+    use_pool = False
+    if jobs > 1:
+        # a pool only pays for itself with more than one chunk to parse
+        head = list(itertools.islice(to_parse, PARSE_CHUNK_SIZE + 1))
+        to_parse = itertools.chain(head, to_parse)
+        use_pool = len(head) > PARSE_CHUNK_SIZE
+
+    parsed = parse_in_pool(to_parse, jobs) if use_pool else parse_serially(to_parse)
+    for path, code, module in tqdm(parsed, "creating objects"):
+        modules[path] = module
+        if cache is not None:
+            cache.put(path, code, module)
+
+    if cache is not None:
+        cache.prune()
+
+    return {modules[path].name: modules[path] for path in paths}
+
+
+def parse_serially(
+    sources: Iterable[tuple[str, str]],
+) -> Iterator[tuple[str, str, ModuleCST]]:
+    for path, code in sources:
+        yield path, code, parse_module_cst(path, code)
+
+
+def parse_in_pool(
+    sources: Iterable[tuple[str, str]],
+    jobs: int,
+) -> Iterator[tuple[str, str, ModuleCST]]:
+    """Parse chunks of `sources` across `jobs` processes, yielding in the order of `sources`."""
+    chunks = itertools.batched(sources, PARSE_CHUNK_SIZE)
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        pending: deque[tuple[tuple[tuple[str, str], ...], Future[list[ModuleCST]]]] = deque()
+        for chunk in chunks:
+            pending.append((chunk, executor.submit(parse_module_csts, chunk)))
+            if len(pending) >= jobs * PENDING_PER_JOB:
+                yield from _zip_chunk(*pending.popleft())
+        while pending:
+            yield from _zip_chunk(*pending.popleft())
+
+
+def parse_module_csts(chunk: tuple[tuple[str, str], ...]) -> list[ModuleCST]:
+    return [parse_module_cst(path, code) for path, code in chunk]
+
+
+def _zip_chunk(
+    chunk: tuple[tuple[str, str], ...],
+    future: Future[list[ModuleCST]],
+) -> Iterator[tuple[str, str, ModuleCST]]:
+    for (path, code), module in zip(chunk, future.result(), strict=True):
+        yield path, code, module
 
 
 @safe
-def get_location_map(src_code: dict[str, str]) -> dict[str, EntityLocation]:
-    def get_line_nos(path: str, source: str) -> list[EntityLocation]:
-        tree = cst.metadata.MetadataWrapper(cst.parse_module(source))
-        visitor = LocationVisitor(path)
-        tree.visit(visitor)
-        return visitor.results
-
-    locations = list(
-        itertools.chain.from_iterable([get_line_nos(path, code) for path, code in src_code.items()])
-    )
+def get_location_map(modules: dict[str, ModuleCST]) -> dict[str, EntityLocation]:
+    locations = itertools.chain.from_iterable(mod.locations for mod in modules.values())
     return {ent.name: ent for ent in locations}
 
 
 @safe
 def resolve_module_calls(modules: dict[str, ModuleCST]) -> dict[str, ModuleCST]:
-    def resolve_calls(
-        calls: list[str],
-        import_map: dict[str, str],
-        func_map: dict[str, str],
-    ) -> list[str]:
-        resolved_calls: list[str] = []
-        for call in calls:
-            if resolved_call := import_map.get(call.split(".")[-1]):
-                if resolved_call.split(".")[-1] != call:
-                    common_removed = ".".join(resolved_call.split(".")[:-1])
-                    resolved_calls.append(f"{common_removed}.{call}".strip("."))
-                else:
-                    resolved_calls.append(resolved_call)
-            elif resolved_call := func_map.get(call.split(".")[0]):
-                resolved_calls.append(resolved_call)
-            else:
-                resolved_calls.append(call)
-        return resolved_calls
+    """Replace each call with the project entity it depends on, leaving other calls as they are."""
+    index = SymbolIndex.from_modules(modules.values())
+
+    def resolve_calls(scope: SymbolNode | None, calls: list[str]) -> list[str]:
+        return [index.resolve(scope, call) or call for call in calls]
 
-    modules = deepcopy(modules)
     modified_modules = {}
 
     for name, mod_obj in tqdm(modules.items(), "resolving calls"):
-        mod = deepcopy(mod_obj)
-
-        import_map = {
-            i.as_name: f"{i.module}.{i.as_name}" if i.module != i.as_name else i.module
-            for i in mod.imports
-        }
-        func_map = {fn.name.split(".")[-1]: fn.name for fn in mod.funcs}
-        cls_map = {cls_.name.split(".")[-1]: cls_.name for cls_ in mod.classes}
-        ent_map = {**func_map, **cls_map}
-
-        for fn in mod.funcs:
-            fn.calls = resolve_calls(fn.calls, import_map, ent_map)
-
-        for cls_ in mod.classes:
-            for fn in cls_.methods:
-                fn.calls = resolve_calls(fn.calls, import_map, ent_map)
+        # a shallow copy is enough as only the calls of the copied entities are replaced
+        mod = copy.copy(mod_obj)
+        scope = index.scope(mod.name)
+
+        mod.funcs = [attrs.evolve(fn, calls=resolve_calls(scope, fn.calls)) for fn in mod.funcs]
+        mod.classes = [
+            attrs.evolve(
+                cls_,
+                methods=[
+                    attrs.evolve(fn, calls=resolve_calls(scope, fn.calls)) for fn in cls_.methods
+                ],
+            )
+            for cls_ in mod.classes
+        ]
 
         modified_modules[name] = mod
     return modified_modules
@@ -128,20 +163,18 @@ def resolve_module_calls(modules: dict[str, ModuleCST]) -> dict[str, ModuleCST]:
 
 @safe
 def extract_entities(modules: dict[str, ModuleCST]) -> dict[str, EntityCST]:
-    modules = deepcopy(modules)
     entities: dict[str, EntityCST] = {}
 
+    # each entity gets its own copy of only the module imports its code uses
     for mod in modules.values():
         for fn in mod.funcs:
-            fn.imports = mod.imports
-            entities[fn.name] = fn
+            entities[fn.name] = attrs.evolve(fn, imports=used_imports(mod.imports, fn.code))
 
         for cls_ in mod.classes:
-            cls_.imports = mod.imports
-            entities[cls_.name] = cls_
+            entities[cls_.name] = attrs.evolve(cls_, imports=used_imports(mod.imports, cls_.code))
 
         for gbl in mod.global_vars:
-            entities[gbl.name] = gbl
+            entities[gbl.name] = attrs.evolve(gbl, imports=used_imports(mod.imports, gbl.code))
 
     return entities
 
@@ -150,7 +183,6 @@ def extract_entities(modules: dict[str, ModuleCST]) -> dict[str, EntityCST]:
 def filter_non_native_calls(
     entities: dict[str, EntityCST],
 ) -> dict[str, EntityCST]:
-    entities = deepcopy(entities)
     return {
         name: ent.filter_native_calls(entities).resolve_native_imports()
         for name, ent in entities.items()
@@ -158,33 +190,27 @@ def filter_non_native_calls(
 
 
 @safe
-def create_call_tree(entities: dict[str, EntityCST]) -> dict[str, list[str]]:
-    return {name: ent.get_call_tree_entries() for name, ent in entities.items()}
+def create_call_graph(entities: dict[str, EntityCST]) -> CallGraph:
+    """Intern the entity names and collect every call between them as integer ids."""
+    return CallGraph.from_call_tree(
+        {name: ent.get_call_tree_entries() for name, ent in entities.items()},
+    )
 
 
 @safe
 def pair_exclusive_calls(adj_mat: AdjMat) -> AdjMat:
-    adj_mat = deepcopy(adj_mat)
-    matrix: np.ndarray = adj_mat.mat
-    communities: list[int] = adj_mat.communities.copy()
-
-    # make it so we don't weight by call count yet
-    adj_bin = (matrix > 0).astype(bool)
-    communities: np.ndarray = np.array(communities, dtype=int)
-
-    changed = True
-    while changed:
-        changed = False
+    n = len(adj_mat.node_map)
+    labels = CommunityLabels.from_list(adj_mat.communities)
 
-        out_deg = adj_bin.sum(axis=1)
-        in_deg = adj_bin.sum(axis=0)
+    # only the nonzero entries are used so we don't weight by call count yet
+    src_idxs, dst_idxs, _ = adj_mat.edges
+    out_deg = np.bincount(src_idxs, minlength=n)
+    in_deg = np.bincount(dst_idxs, minlength=n)
 
-        rows, cols = np.where((out_deg == 1)[:, None] & adj_bin & (in_deg == 1))
+    exclusive = (out_deg[src_idxs] == 1) & (in_deg[dst_idxs] == 1)
 
-        for a, b in zip(rows, cols, strict=False):
-            if communities[b] != communities[a]:
-                communities[communities == communities[b]] = communities[a]
-                changed = True
+    # merges never split a community so a single pass reaches the fixed point
+    for a, b in zip(src_idxs[exclusive].tolist(), dst_idxs[exclusive].tolist(), strict=True):
+        labels.merge(labels.label_of(a), labels.label_of(b))
 
-    adj_mat.communities = communities.tolist()
-    return adj_mat
+    return attrs.evolve(adj_mat, communities=labels.to_list())
@@ -1,11 +1,12 @@
 import os
 from collections import Counter, defaultdict
-from copy import deepcopy
+
+import attrs
 
 from spaghettree import safe
 from spaghettree.domain.adj_mat import AdjMat
 from spaghettree.domain.imports import ImportCST
-from spaghettree.domain.parsing import EntityCST, cst_to_str
+from spaghettree.domain.parsing import EntityCST
 
 
 @safe
@@ -30,12 +31,9 @@ def infer_module_names(
 
     for contents in new_modules.values():
         if len(contents) > 1:
-            names = [".".join(ent.name.split(".")[:-1]) for ent in contents]
-            possible_module_names = sorted(
-                {(name, names.count(name)) for name in names},
-                key=lambda x: x[1],
-                reverse=True,
-            )
+            names = [ent.name.rpartition(".")[0] for ent in contents]
+            # ties keep the order the names first appear in so the naming is deterministic
+            possible_module_names = Counter(names).most_common()
             for name, _ in possible_module_names:
                 if name not in renamed_modules:
                     mod_name = name
@@ -52,13 +50,13 @@ def infer_module_names(
 def rename_overlapping_mod_names(
     renamed_modules: dict[str, list[EntityCST]],
 ) -> dict[str, list[EntityCST]]:
-    def rename_mod_name(name: str, renamed_modules: list[str]) -> str:
+    # the module names and their dirnames are the same for every rename so are split once
+    dirname_counts = Counter(name.rpartition(".")[0] for name in renamed_modules)
+
+    def rename_mod_name(name: str) -> str:
         name_parts = name.split(".")
         dirname = ".".join(name_parts[:-1])
 
-        dirnames = [".".join(m.split(".")[:-1]) for m in renamed_modules]
-        dirname_counts = Counter(dirnames)
-
         if dirname not in renamed_modules and dirname_counts.get(dirname, 0) <= 1:
             return dirname
 
@@ -67,22 +65,22 @@ def rename_overlapping_mod_names(
 
         return name
 
-    mod_names = list(renamed_modules)
-    return {
-        rename_mod_name(name, mod_names): contents for name, contents in renamed_modules.items()
-    }
+    return {rename_mod_name(name): contents for name, contents in renamed_modules.items()}
 
 
 @safe
 def remap_imports(
     modules: dict[str, list[EntityCST]],
 ) -> dict[str, list[EntityCST]]:
-    modules = deepcopy(modules)
     entity_mod_map: dict[str, str] = {
         ent.name: mod_name for mod_name, ents in modules.items() for ent in ents
     }
 
+    remapped_modules: dict[str, list[EntityCST]] = {}
+
     for mod_name, ents in modules.items():
+        remapped_ents: list[EntityCST] = []
+
         for ent in ents:
             updated_imports: list[ImportCST] = []
 
@@ -100,8 +98,10 @@ def remap_imports(
                         ),
                     )
 
-            ent.imports = updated_imports
-    return modules
+            # imports of entities that moved to the same module collapse into one
+            remapped_ents.append(attrs.evolve(ent, imports=list(dict.fromkeys(updated_imports))))
+        remapped_modules[mod_name] = remapped_ents
+    return remapped_modules
 
 
 @safe
@@ -125,12 +125,14 @@ def convert_to_code_str(
 
         for ent in mod_contents:
             imports.extend([imp.to_str() for imp in ent.imports])
-            code.append(cst_to_str(ent.tree))
+            code.append(ent.code)
 
         return "".join(sorted(set(imports))) + "".join(code)
 
     return {
-        mod_name: get_module_str(sorted(contents, key=lambda x: order_map[x.name.split(".")[-1]]))
+        mod_name: get_module_str(
+            sorted(contents, key=lambda x: order_map[x.name.rpartition(".")[2]])
+        )
         for mod_name, contents in new_modules.items()
     }
 
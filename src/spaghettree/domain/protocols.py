@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import Any, Protocol, runtime_checkable
+
+from spaghettree import safe
+
+
+@runtime_checkable
+class CacheProtocol(Protocol):
+    @safe
+    def get(self, path: str, code: str) -> Any: ...  # noqa: ANN401
+
+    @safe
+    def put(self, path: str, code: str, value: Any) -> None: ...  # noqa: ANN401
+
+    @safe
+    def prune(self) -> int: ...
+
+    @safe
+    def clear(self) -> int: ...
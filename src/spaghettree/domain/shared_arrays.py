@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import sys
+from multiprocessing.shared_memory import SharedMemory
+from typing import Self
+
+import attrs
+import numpy as np
+
+
+@attrs.define
+class SharedArrays:
+    """Numpy arrays backed by shared memory so worker processes can read them without copies."""
+
+    arrays: dict[str, np.ndarray] = attrs.field()
+    blocks: list[SharedMemory] = attrs.field()
+
+    @classmethod
+    def create(cls, arrays: dict[str, np.ndarray]) -> Self:
+        shared, blocks = {}, []
+        for key, arr in arrays.items():
+            block = SharedMemory(create=True, size=max(arr.nbytes, 1))
+            shared[key] = np.ndarray(arr.shape, arr.dtype, buffer=block.buf)
+            shared[key][...] = arr
+            blocks.append(block)
+        return cls(shared, blocks)
+
+    @classmethod
+    def attach(cls, spec: dict[str, tuple[str, tuple[int, ...], str]]) -> Self:
+        shared, blocks = {}, []
+        for key, (name, shape, dtype) in spec.items():
+            # only the creating process should unlink the block
+            if sys.version_info >= (3, 13):
+                block = SharedMemory(name, track=False)
+            else:  # pragma: no cover
+                block = SharedMemory(name)
+            shared[key] = np.ndarray(shape, dtype, buffer=block.buf)
+            blocks.append(block)
+        return cls(shared, blocks)
+
+    @property
+    def spec(self) -> dict[str, tuple[str, tuple[int, ...], str]]:
+        return {
+            key: (block.name, arr.shape, arr.dtype.str)
+            for (key, arr), block in zip(self.arrays.items(), self.blocks, strict=True)
+        }
+
+    def close(self, *, unlink: bool = False) -> None:
+        # the views must go before the buffers they point into can be released
+        self.arrays.clear()
+        for block in self.blocks:
+            block.close()
+            if unlink:
+                block.unlink()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Self
+
+import attrs
+
+from spaghettree.domain.entities import ModuleCST
+from spaghettree.domain.imports import ImportCST, ImportType
+
+# aliases of aliases are followed this many times before giving up, which also ends import cycles
+MAX_ALIAS_HOPS = 16
+
+
+@attrs.define
+class SymbolNode:
+    # most nodes are leaves, so their children are only created once they have some
+    children: dict[str, SymbolNode] | None = attrs.field(default=None)
+    # the top level entity a call reaching this node depends on
+    entity: str | None = attrs.field(default=None)
+    # the path this name was imported from, looked up from the root when the walk reaches it
+    alias: tuple[str, ...] | None = attrs.field(default=None)
+    # what the alias led to, remembered after the first lookup
+    target: SymbolNode | None = attrs.field(default=None, repr=False)
+    followed: bool = attrs.field(default=False, repr=False)
+
+
+@attrs.define
+class SymbolIndex:
+    """Trie of every module, entity, method and import alias of a project, keyed by path segment.
+
+    An import adds its bound name as a child of the importing module that points at the imported
+    path, so a call is resolved from the calling module with one walk along its segments, going
+    through any aliases, re-exports and attribute chains on the way. Where each alias leads is
+    remembered once looked up, so the index shouldn't be added to after resolving with it.
+    """
+
+    root: SymbolNode = attrs.field(factory=SymbolNode)
+
+    @classmethod
+    def from_modules(cls, modules: Iterable[ModuleCST]) -> Self:
+        index = cls()
+        scopes = [(mod, index.add(mod.name)) for mod in modules]
+
+        for mod, scope in scopes:
+            for ent in (*mod.funcs, *mod.classes, *mod.global_vars):
+                add_child(scope, ent.name.rpartition(".")[2]).entity = ent.name
+            for cls_ in mod.classes:
+                cls_node = add_child(scope, cls_.name.rpartition(".")[2])
+                for method in cls_.methods:
+                    add_child(cls_node, method.name.rpartition(".")[2]).entity = cls_.name
+
+        # definitions are added first so they take precedence over imports of the same name
+        for mod, scope in scopes:
+            for imp in mod.imports:
+                if (binding := import_binding(imp)) is None:
+                    continue
+                name, target = binding
+                node = add_child(scope, name)
+                if node.entity is None and node.alias is None:
+                    node.alias = tuple(target.split("."))
+        return index
+
+    def add(self, path: str) -> SymbolNode:
+        node = self.root
+        for part in path.split("."):
+            node = add_child(node, part)
+        return node
+
+    def scope(self, module: str) -> SymbolNode | None:
+        """The node of `module`, whose children are the names defined in or imported into it."""
+        return self._walk(self.root, module.split("."), 0)
+
+    def resolve(self, scope: SymbolNode | None, call: str) -> str | None:
+        """The entity `call`, made from the module `scope`, depends on, if it's in the project."""
+        node = scope
+        resolved = None
+
+        for part in call.split("."):
+            if node is None:
+                break
+            node = child(node, part)
+            if node is not None and node.alias is not None:
+                node = self._follow(node, 0)
+            if node is not None and node.entity is not None:
+                resolved = node.entity
+        return resolved
+
+    def _walk(self, node: SymbolNode | None, parts: Iterable[str], hops: int) -> SymbolNode | None:
+        for part in parts:
+            if node is None:
+                return None
+            node = self._follow(child(node, part), hops)
+        return node
+
+    def _follow(self, node: SymbolNode | None, hops: int) -> SymbolNode | None:
+        if node is None or node.alias is None:
+            return node
+        if not node.followed:
+            if hops >= MAX_ALIAS_HOPS:
+                return None
+            node.target = self._walk(self.root, node.alias, hops + 1)
+            node.followed = True
+        return node.target
+
+
+def add_child(node: SymbolNode, part: str) -> SymbolNode:
+    if node.children is None:
+        node.children = {}
+    if (found := node.children.get(part)) is None:
+        found = node.children[part] = SymbolNode()
+    return found
+
+
+def child(node: SymbolNode, part: str) -> SymbolNode | None:
+    if (children := node.children) is None:
+        return None
+    # names defined in a package's `__init__` are also reached from the package itself
+    if (found := children.get(part)) is None and (init := children.get("__init__")):
+        return child(init, part)
+    return found
+
+
+def import_binding(imp: ImportCST) -> tuple[str, str] | None:
+    """The name `imp` binds in the importing module and the path it refers to."""
+    if imp.name == "*":
+        return None
+    if imp.import_type is ImportType.FROM:
+        return imp.bound_name, f"{imp.module}.{imp.name}"
+    if imp.as_name != imp.name:
+        return imp.bound_name, imp.module
+    return imp.bound_name, imp.bound_name
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator, Mapping
+from typing import Self
+
+import attrs
+
+
+@attrs.define(eq=False)
+class SymbolTable(Mapping[int, str]):
+    """Qualified entity names interned to dense integer ids.
+
+    Each name is split into its module, everything before the last dot, and its leaf name once
+    when it is interned, so the stages working on an `AdjMat` look the parts up instead of
+    splitting the name again. It reads as a mapping of id to name so it can stand in for a
+    `node_map` dict.
+    """
+
+    names: list[str] = attrs.field(factory=list)
+    modules: list[str] = attrs.field(factory=list)
+    leaves: list[str] = attrs.field(factory=list)
+    ids: dict[str, int] = attrs.field(factory=dict)
+
+    @classmethod
+    def from_names(cls, names: Iterable[str]) -> Self:
+        table = cls()
+        for name in names:
+            table.intern(name)
+        return table
+
+    @classmethod
+    def from_node_map(cls, node_map: Mapping[int, str]) -> Self:
+        """The table of a `node_map` whose keys are the ids 0 to n - 1."""
+        if isinstance(node_map, cls):
+            return node_map
+        return cls.from_names(node_map[idx] for idx in range(len(node_map)))
+
+    def intern(self, name: str) -> int:
+        if (idx := self.ids.get(name)) is not None:
+            return idx
+        idx = len(self.names)
+        module, _, leaf = name.rpartition(".")
+        self.names.append(name)
+        self.modules.append(module)
+        self.leaves.append(leaf)
+        self.ids[name] = idx
+        return idx
+
+    def __getitem__(self, idx: int) -> str:
+        if not 0 <= idx < len(self.names):
+            raise KeyError(idx)
+        return self.names[idx]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.names)))
+
+    def __len__(self) -> int:
+        return len(self.names)
@@ -3,23 +3,7 @@ from __future__ import annotations
 import attrs
 import libcst as cst
 
-
-@attrs.define
-class CallVisitor(cst.CSTVisitor):
-    calls: list[str] = attrs.field(factory=list)
-
-    def visit_Call(self, node: cst.Call) -> None:  # noqa: N802
-        full_name = self._resolve_attr(node.func)
-        if full_name:
-            self.calls.append(full_name)
-
-    def _resolve_attr(self, node: cst.BaseExpression) -> str | None:
-        if isinstance(node, cst.Name):
-            return node.value
-        if isinstance(node, cst.Attribute):
-            parent = self._resolve_attr(node.value)
-            return f"{parent}.{node.attr.value}" if parent else node.attr.value
-        return None
+from spaghettree.domain.imports import ImportCST, ImportType
 
 
 @attrs.define(frozen=True, eq=True, order=True)
@@ -29,48 +13,114 @@ class EntityLocation:
     line_no: int = attrs.field()
 
 
-class LocationVisitor(cst.CSTVisitor):
-    METADATA_DEPENDENCIES = (cst.metadata.PositionProvider,)
+@attrs.define
+class Definition:
+    node: cst.FunctionDef | cst.ClassDef = attrs.field(repr=False)
+    calls: list[str] = attrs.field(factory=list)
+    methods: dict[int, Definition] = attrs.field(factory=dict)
+
 
-    def __init__(self, path: str) -> None:
-        self.path = path
-        self.results = []
-        self.depth = 0
-        super().__init__()
+@attrs.define
+class ModuleVisitor(cst.CSTVisitor):
+    """Collects every fact `ModuleCST` is made from in a single traversal of a module's tree.
+
+    The imports and global variables are read off the top level statements before the traversal,
+    so a function can be matched against the globals it reads even if they're defined below it.
+    The calls are collected per top level function and per method of a top level class.
+    """
 
-    def visit_IndentedBlock(self, _: cst.IndentedBlock) -> bool | None:  # noqa: N802
-        self.depth += 1
+    imports: list[ImportCST] = attrs.field(factory=list)
+    # later definitions with the same name replace the earlier ones
+    funcs: dict[str, Definition] = attrs.field(factory=dict)
+    classes: dict[str, Definition] = attrs.field(factory=dict)
+    global_vars: list[tuple[str, cst.SimpleStatementLine]] = attrs.field(factory=list)
+    # the name of each global read in a top level definition, paired with the definition's name
+    references: list[tuple[str, str]] = attrs.field(factory=list)
+    top_level: set[int] = attrs.field(factory=set, repr=False)
+    global_names: set[str] = attrs.field(factory=set, repr=False)
+    entity: Definition | None = attrs.field(default=None, repr=False)
+    method: Definition | None = attrs.field(default=None, repr=False)
 
-    def leave_IndentedBlock(self, _: cst.IndentedBlock) -> bool | None:  # noqa: N802
-        self.depth -= 1
+    def visit_Module(self, node: cst.Module) -> None:  # noqa: N802
+        for stmt in node.body:
+            self.top_level.add(id(stmt))
+            if not isinstance(stmt, cst.SimpleStatementLine):
+                continue
+            if isinstance(stmt.body[0], (cst.Import, cst.ImportFrom)):
+                for small_stmt in stmt.body:
+                    self._add_imports(small_stmt)
+            for assign in stmt.body:
+                if isinstance(assign, cst.Assign):
+                    self.global_vars.extend(
+                        (target.target.value, stmt)
+                        for target in assign.targets
+                        if isinstance(target.target, cst.Name)
+                    )
+        self.global_names = {name for name, _ in self.global_vars}
 
     def visit_ClassDef(self, node: cst.ClassDef) -> None:  # noqa: N802
-        self.results.append(
-            EntityLocation(
-                path=self.path,
-                name=node.name.value,
-                line_no=self.get_metadata(cst.metadata.PositionProvider, node).start.line,
-            )
-        )
+        if id(node) in self.top_level:
+            self.entity = self.classes[node.name.value] = Definition(node)
+            self.entity.methods = {
+                id(method): Definition(method)
+                for method in node.body.children
+                if isinstance(method, cst.FunctionDef)
+            }
+
+    def leave_ClassDef(self, node: cst.ClassDef) -> None:  # noqa: N802
+        if self.entity is not None and self.entity.node is node:
+            self.entity = None
 
     def visit_FunctionDef(self, node: cst.FunctionDef) -> None:  # noqa: N802
-        self.results.append(
-            EntityLocation(
-                path=self.path,
-                name=node.name.value,
-                line_no=self.get_metadata(cst.metadata.PositionProvider, node).start.line,
-            )
-        )
-
-    def visit_Assign(self, node: cst.Assign) -> None:  # noqa: N802
-        for target in node.targets:
-            if isinstance(target.target, cst.Name) and self.depth == 0:
-                self.results.append(
-                    EntityLocation(
-                        path=self.path,
-                        name=target.target.value,
-                        line_no=self.get_metadata(
-                            cst.metadata.PositionProvider, target.target
-                        ).start.line,
-                    )
-                )
+        if id(node) in self.top_level:
+            self.entity = self.funcs[node.name.value] = Definition(node)
+        elif self.entity is not None and self.method is None:
+            self.method = self.entity.methods.get(id(node))
+
+    def leave_FunctionDef(self, node: cst.FunctionDef) -> None:  # noqa: N802
+        if self.method is not None and self.method.node is node:
+            self.method = None
+        elif self.entity is not None and self.entity.node is node:
+            self.entity = None
+
+    def visit_Call(self, node: cst.Call) -> None:  # noqa: N802
+        calls_to = self.method or self.entity
+        # the calls a class makes outside of its methods aren't kept
+        if calls_to is None or isinstance(calls_to.node, cst.ClassDef):
+            return
+        if full_name := dotted_name(node.func):
+            calls_to.calls.append(full_name)
+
+    def visit_Name(self, node: cst.Name) -> None:  # noqa: N802
+        if self.entity is not None and node.value in self.global_names:
+            self.references.append((node.value, self.entity.node.name.value))
+
+    def _add_imports(self, node: cst.BaseSmallStatement) -> None:
+        if isinstance(node, cst.Import):
+            for alias in node.names:
+                name = dotted_name(alias.name)
+                asname = alias.asname.name.value if alias.asname else name
+                self.imports.append(ImportCST(name, ImportType.IMPORT, name, asname))
+
+        elif isinstance(node, cst.ImportFrom):
+            module = dotted_name(node.module)
+            if module is None:
+                return  # skip relative imports
+
+            if isinstance(node.names, cst.ImportStar):
+                self.imports.append(ImportCST(module, ImportType.FROM, "*", "*"))
+                return
+
+            for alias in node.names:
+                name = dotted_name(alias.name)
+                asname = alias.asname.name.value if alias.asname else name
+                self.imports.append(ImportCST(module, ImportType.FROM, name, asname))
+
+
+def dotted_name(node: cst.BaseExpression | None) -> str | None:
+    if isinstance(node, cst.Name):
+        return node.value
+    if isinstance(node, cst.Attribute):
+        parent = dotted_name(node.value)
+        return f"{parent}.{node.attr.value}" if parent else node.attr.value
+    return None
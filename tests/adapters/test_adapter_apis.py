@@ -4,6 +4,8 @@ from collections.abc import Callable
 import pytest
 
 from spaghettree.adapters.io_wrapper import FakeIOWrapper, IOProtocol, IOWrapper
+from spaghettree.adapters.parse_cache import FakeParseCache, ParseCache
+from spaghettree.domain.protocols import CacheProtocol
 
 
 @pytest.mark.parametrize(
@@ -11,6 +13,8 @@ from spaghettree.adapters.io_wrapper import FakeIOWrapper, IOProtocol, IOWrapper
     [
         pytest.param(IOWrapper(), IOProtocol),
         pytest.param(FakeIOWrapper(), IOProtocol),
+        pytest.param(ParseCache(), CacheProtocol),
+        pytest.param(FakeParseCache(), CacheProtocol),
     ],
 )
 def test_protocols(obj, protocol):
@@ -75,6 +79,16 @@ class FakeMismatchingSignature:
             IOProtocol,
             id="ensure IO wrapper matches protocol",
         ),
+        pytest.param(
+            ParseCache(),
+            FakeParseCache(),
+            id="ensure parse cache matches fake",
+        ),
+        pytest.param(
+            ParseCache,
+            CacheProtocol,
+            id="ensure parse cache matches protocol",
+        ),
     ],
 )
 def test_api_match(real: object, fake: object) -> None:
@@ -0,0 +1,91 @@
+import pytest
+
+from spaghettree.adapters import formatting
+from spaghettree.adapters.formatting import format_files
+from spaghettree.adapters.parse_cache import FakeParseCache, ParseCache
+
+UNFORMATTED = "import sys\nimport os\ndef func_a( x ):\n  return os.path.join(x,'a')\n"
+
+
+@pytest.mark.parametrize(
+    ("formatter", "expected"),
+    [
+        pytest.param(
+            "ruff",
+            'import os\n\n\ndef func_a(x):\n    return os.path.join(x, "a")\n',
+            id="ruff",
+        ),
+        pytest.param(
+            "black",
+            'import os\nimport sys\n\n\ndef func_a(x):\n    return os.path.join(x, "a")\n',
+            id="black",
+        ),
+        pytest.param("none", UNFORMATTED, id="none"),
+    ],
+)
+def test_format_files(formatter, expected, tmp_path):
+    path = f"{tmp_path}/src/pkg/mod_a.py"
+    res = format_files({path: UNFORMATTED}, formatter=formatter)
+
+    assert res.is_ok()
+    assert res.inner == {path: expected}
+
+
+def test_ruff_uses_each_files_project_config(tmp_path):
+    (tmp_path / "narrow").mkdir()
+    (tmp_path / "narrow" / "pyproject.toml").write_text(
+        '[tool.ruff]\nline-length = 20\n\n[tool.ruff.lint.per-file-ignores]\n"keep/*" = ["F401"]\n'
+    )
+    code = "import os\nVALUE = [111111, 222222]\n"
+    src_code = {
+        f"{tmp_path}/narrow/pkg/mod_a.py": code,
+        f"{tmp_path}/narrow/keep/mod_b.py": code,
+        f"{tmp_path}/wide/pkg/mod_c.py": code,
+    }
+
+    res = format_files(src_code, formatter="ruff")
+
+    assert res.is_ok()
+    assert list(res.inner.values()) == [
+        "VALUE = [\n    111111,\n    222222,\n]\n",
+        "import os\n\nVALUE = [\n    111111,\n    222222,\n]\n",
+        "VALUE = [111111, 222222]\n",
+    ]
+
+
+def test_format_files_in_pool(tmp_path):
+    src_code = {
+        f"{tmp_path}/src/pkg/mod_{idx}.py": f"def func_{idx}( x ):\n  return x+{idx}\n"
+        for idx in range(2 * formatting.FORMAT_CHUNK_SIZE + 1)
+    }
+    expected = format_files(src_code, formatter="black").inner
+
+    res = format_files(src_code, formatter="black", jobs=2)
+
+    assert res.is_ok()
+    assert list(res.inner) == list(src_code)
+    assert res.inner == expected
+
+
+@pytest.mark.parametrize(
+    "make_cache",
+    [
+        pytest.param(lambda tmp_path: ParseCache(tmp_path), id="disk"),
+        pytest.param(lambda tmp_path: FakeParseCache(), id="fake"),
+    ],
+)
+def test_unchanged_files_are_not_reformatted(make_cache, tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    src_code = {"src/pkg/mod_a.py": UNFORMATTED, "src/pkg/mod_b.py": "x=1\n"}
+    expected = format_files(src_code, formatter="black", cache=cache).inner
+
+    def fail_to_format(chunk):
+        raise AssertionError(chunk)
+
+    monkeypatch.setitem(formatting.FORMATTERS, "black", fail_to_format)
+    assert format_files(src_code, formatter="black", cache=cache).inner == expected
+
+    # the formatter is part of the key so switching formatters misses the cache
+    assert format_files(src_code, formatter="ruff", cache=cache).inner != expected
+    changed = {**src_code, "src/pkg/mod_b.py": "x=2\n"}
+    assert not format_files(changed, formatter="black", cache=cache).is_ok()
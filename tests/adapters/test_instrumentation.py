@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from spaghettree import safe
+from spaghettree.adapters.instrumentation import Instrumentation, score_of, size_of
+from spaghettree.domain.adj_mat import AdjMat, CallGraph
+from spaghettree.domain.optimisation import get_dwm
+
+
+@safe
+def double(items: list[int]) -> list[int]:
+    return items * 2
+
+
+@safe
+def fail(items: list[int]) -> list[int]:
+    raise ValueError(items)
+
+
+@pytest.mark.parametrize("track_memory", [True, False])
+def test_stage_records(track_memory):
+    records = []
+    instrumentation = Instrumentation(callback=records.append, track_memory=track_memory)
+
+    res = instrumentation.stage("double", double)([1, 2, 3]).and_then(
+        instrumentation.stage("fail", fail),
+    )
+
+    assert not res.is_ok()
+    assert records == instrumentation.records
+    assert [(r.name, r.ok, r.input_size, r.output_size) for r in records] == [
+        ("double", True, 3, 6),
+        ("fail", False, 6, None),
+    ]
+    assert all(r.wall_s >= 0 and r.cpu_s >= 0 for r in records)
+    assert all((r.peak_bytes is not None) == track_memory for r in records)
+
+    report = instrumentation.report()
+    assert [stage["name"] for stage in report["stages"]] == ["double", "fail"]
+    assert report["total_wall_s"] == pytest.approx(sum(r.wall_s for r in records))
+
+
+@pytest.mark.parametrize(
+    ("obj", "expected"),
+    [
+        pytest.param([1, 2], 2, id="list"),
+        pytest.param({"a": 1}, 1, id="dict"),
+        pytest.param(AdjMat(np.zeros((3, 3)), {0: "a", 1: "b", 2: "c"}, [0, 1, 2]), 3, id="adj"),
+        pytest.param(CallGraph.from_call_tree({"a": ["b"], "b": []}), 2, id="call graph"),
+        pytest.param(None, None, id="no length"),
+    ],
+)
+def test_size_of(obj, expected):
+    assert size_of(obj) == expected
+
+
+def test_score_of():
+    adj_mat = AdjMat.from_call_tree({"a": ["b"], "b": ["a"], "c": ["d"], "d": []}).inner
+    adj_mat.communities = [0, 0, 1, 1]
+
+    assert score_of(adj_mat) == get_dwm(adj_mat, [0, 0, 1, 1])
+    assert score_of(AdjMat(np.zeros((2, 2)), {0: "a", 1: "b"}, [0, 1])) is None
+    assert score_of([1, 2]) is None
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from spaghettree.adapters.io_wrapper import FakeIOWrapper, IOWrapper, WriteSummary
+
+
+@pytest.mark.parametrize(
+    "io",
+    [
+        pytest.param(IOWrapper(), id="real"),
+        pytest.param(FakeIOWrapper(), id="fake"),
+    ],
+)
+def test_write_files_only_writes_changes(io, tmp_path):
+    root = f"{tmp_path}/src"
+    io.write("A = 1\n", f"{root}/pkg/mod_a.py", format_code=False)
+    io.write("B = 1\n", f"{root}/pkg/mod_b.py", format_code=False)
+    io.write("C = 1\n", f"{root}/pkg/mod_c.py", format_code=False)
+    if isinstance(io, IOWrapper):
+        os.utime(f"{root}/pkg/mod_a.py", (0, 0))
+
+    src_code = {
+        f"{root}/pkg/mod_a.py": "A = 1\n",
+        f"{root}/pkg/mod_b.py": "B = 2\n",
+        f"{root}/pkg/mod_d.py": "D = 1\n",
+    }
+    res = io.write_files(src_code, format_code=False, prune_root=root)
+
+    assert res.is_ok()
+    assert res.inner == WriteSummary(
+        created=[f"{root}/pkg/mod_d.py"],
+        changed=[f"{root}/pkg/mod_b.py"],
+        unchanged=[f"{root}/pkg/mod_a.py"],
+        deleted=[f"{root}/pkg/mod_c.py"],
+    )
+    assert str(res.inner) == "1 created, 1 changed, 1 unchanged, 1 deleted"
+    assert dict(io.read_files(root).inner) == src_code
+    if isinstance(io, IOWrapper):
+        assert os.stat(f"{root}/pkg/mod_a.py").st_mtime == 0
+
+    res = io.write_files(src_code, format_code=False)
+    assert res.inner.counts() == {"created": 0, "changed": 0, "unchanged": 3, "deleted": 0}
+
+
+@pytest.mark.parametrize(
+    "io",
+    [
+        pytest.param(IOWrapper(), id="real"),
+        pytest.param(FakeIOWrapper(), id="fake"),
+    ],
+)
+def test_write_files_formatted_rerun_is_unchanged(io, tmp_path):
+    root = f"{tmp_path}/src"
+    src_code = {
+        f"{root}/pkg/mod_a.py": "import sys\nimport os\ndef f(x):\n  return [sys.argv,x]\n",
+        f"{root}/pkg/mod_b.py": "B = {'a':1}\n",
+    }
+
+    res = io.write_files(src_code)
+    assert res.inner.counts() == {"created": 2, "changed": 0, "unchanged": 0, "deleted": 0}
+
+    res = io.write_files(src_code)
+    assert res.inner.counts() == {"created": 0, "changed": 0, "unchanged": 2, "deleted": 0}
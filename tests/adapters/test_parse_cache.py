@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from spaghettree.adapters import parse_cache
+from spaghettree.adapters.parse_cache import FakeParseCache, ParseCache
+from spaghettree.domain import parsing
+from spaghettree.domain.parsing import create_module_cst_objs
+
+SRC_CODE = {
+    "src/pkg/mod_a.py": "from pkg.mod_b import func_b\n\n\ndef func_a():\n    return func_b()\n",
+    "src/pkg/mod_b.py": "CONSTANT = 1\n\n\ndef func_b():\n    return CONSTANT\n",
+}
+
+
+@pytest.mark.parametrize(
+    "make_cache",
+    [
+        pytest.param(lambda tmp_path: ParseCache(tmp_path), id="disk"),
+        pytest.param(lambda tmp_path: FakeParseCache(), id="fake"),
+    ],
+)
+def test_unchanged_files_are_not_reparsed(make_cache, tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    expected = create_module_cst_objs(SRC_CODE, cache=cache).inner
+
+    def fail_to_parse(path, code):
+        raise AssertionError(path)
+
+    monkeypatch.setattr(parsing, "parse_module_cst", fail_to_parse)
+    res = create_module_cst_objs(SRC_CODE, cache=cache)
+
+    assert res.is_ok()
+    assert res.inner == expected
+
+    changed = {**SRC_CODE, "src/pkg/mod_b.py": "def func_b():\n    return 2\n"}
+    assert not create_module_cst_objs(changed, cache=cache).is_ok()
+
+
+@pytest.mark.parametrize(
+    "make_cache",
+    [
+        pytest.param(lambda tmp_path: ParseCache(tmp_path), id="disk"),
+        pytest.param(lambda tmp_path: FakeParseCache(), id="fake"),
+    ],
+)
+def test_new_cache_format_misses(make_cache, tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    path, code = next(iter(SRC_CODE.items()))
+    assert cache.put(path, code, "parsed").is_ok()
+    assert cache.get(path, code).inner == "parsed"
+
+    monkeypatch.setattr(parse_cache, "CACHE_FORMAT", parse_cache.CACHE_FORMAT + 1)
+
+    assert cache.get(path, code).inner is None
+
+
+def test_prune_evicts_least_recently_used(tmp_path):
+    cache = ParseCache(tmp_path)
+    modules = create_module_cst_objs(SRC_CODE, cache=cache).inner
+    entries = sorted(tmp_path.glob("*.pkl"))
+    assert len(entries) == 2
+
+    # age the entries then read one so the other is the least recently used
+    for entry in entries:
+        os.utime(entry, (0, 0))
+    assert cache.get("src/pkg/mod_a.py", SRC_CODE["src/pkg/mod_a.py"]).inner == modules["pkg.mod_a"]
+
+    cache.max_bytes = max(entry.stat().st_size for entry in entries)
+    assert cache.prune().inner == 1
+    assert cache.get("src/pkg/mod_b.py", SRC_CODE["src/pkg/mod_b.py"]).inner is None
+    assert cache.get("src/pkg/mod_a.py", SRC_CODE["src/pkg/mod_a.py"]).inner is not None
+
+    assert cache.clear().inner == 1
+    assert list(tmp_path.glob("*.pkl")) == []
@@ -0,0 +1,39 @@
+from collections.abc import Callable
+
+import numpy as np
+import pytest
+
+from spaghettree.domain.adj_mat import AdjMat, SparseMat
+
+
+@pytest.fixture
+def mat() -> np.ndarray:
+    return np.array(
+        [
+            [0, 1, 0, 0, 0, 0],
+            [0, 0, 0, 0, 1, 0],
+            [0, 3, 0, 0, 0, 0],
+            [1, 0, 2, 3, 0, 0],
+            [0, 0, 3, 0, 0, 0],
+            [1, 3, 0, 3, 0, 0],
+        ]
+    )
+
+
+@pytest.fixture
+def planted_adj_mat() -> Callable[..., AdjMat]:
+    """Factory of graphs of `n_groups` densely connected groups with sparse edges between them."""
+
+    def make(n_groups: int, group_size: int, seed: int, *, sparse: bool = False) -> AdjMat:
+        rng = np.random.default_rng(seed)
+        n = n_groups * group_size
+        groups = np.arange(n) // group_size
+        p = np.where(groups[:, None] == groups[None, :], 0.4, 0.02)
+        mat = (rng.random((n, n)) < p) * rng.integers(1, 4, (n, n))
+        if sparse:
+            rows, cols = np.nonzero(mat)
+            counts = mat[rows, cols]
+            mat = SparseMat.from_edges(np.repeat(rows, counts), np.repeat(cols, counts), n)
+        return AdjMat(mat, {i: str(i) for i in range(n)}, list(range(n)))
+
+    return make
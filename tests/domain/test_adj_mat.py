@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from spaghettree.domain.adj_mat import AdjMat, CommunityLabels, SparseMat
+from spaghettree.domain.entities import FuncCST
+from spaghettree.domain.optimisation import get_dwm, optimise_communities
+from spaghettree.domain.parsing import create_call_graph, pair_exclusive_calls
+
+CALL_TREE = {
+    "mod_a.func_a": ["mod_a.func_b", "mod_a.func_b", "mod_b.func_d"],
+    "mod_a.func_b": [],
+    "mod_a.func_c": ["mod_b.func_d"],
+    "mod_a.isolated": [],
+    "mod_b.func_d": [],
+    "mod_b.func_e": ["mod_b.func_d", "mod_b.CONSTANT"],
+    "mod_b.CONSTANT": ["mod_b.func_e"],
+    "mod_b.ClassA": ["mod_b.func_d", "mod_b.func_d"],
+}
+
+
+@pytest.mark.parametrize("dtype", [np.int8, np.int32, np.int64])
+def test_sparse_matches_dense(dtype):
+    dense = AdjMat.from_call_tree(CALL_TREE, dtype=dtype, sparse=False).inner
+    sparse = AdjMat.from_call_tree(CALL_TREE, dtype=dtype, sparse=True).inner
+
+    assert isinstance(sparse.mat, SparseMat)
+    assert sparse.mat.dtype == dense.mat.dtype == dtype
+    np.testing.assert_array_equal(sparse.mat.toarray(), dense.mat)
+    np.testing.assert_array_equal(sparse.mat.sum(axis=0), dense.mat.sum(axis=0))
+    np.testing.assert_array_equal(sparse.mat.sum(axis=1), dense.mat.sum(axis=1))
+    for sparse_arr, dense_arr in zip(sparse.edges, dense.edges, strict=True):
+        np.testing.assert_array_equal(sparse_arr, dense_arr)
+
+
+@pytest.mark.parametrize(
+    "communities",
+    [
+        pytest.param([0, 1, 2, 3, 4, 5, 6, 7], id="singletons"),
+        pytest.param([0, 0, 2, 3, 2, 2, 6, 2], id="partially merged"),
+        pytest.param([0] * 8, id="one community"),
+    ],
+)
+def test_sparse_dwm_matches_dense(communities):
+    dense = AdjMat.from_call_tree(CALL_TREE, sparse=False).inner
+    sparse = AdjMat.from_call_tree(CALL_TREE, sparse=True).inner
+
+    assert get_dwm(sparse, communities) == pytest.approx(get_dwm(dense, communities))
+
+
+def test_sparse_pipeline_matches_dense():
+    dense = AdjMat.from_call_tree(CALL_TREE, sparse=False)
+    sparse = AdjMat.from_call_tree(CALL_TREE, sparse=True)
+
+    dense_res = dense.and_then(pair_exclusive_calls).and_then(optimise_communities)
+    sparse_res = sparse.and_then(pair_exclusive_calls).and_then(optimise_communities)
+
+    assert sparse_res.inner.communities == dense_res.inner.communities
+
+
+def test_sparse_chosen_above_dense_limit(monkeypatch):
+    monkeypatch.setattr("spaghettree.domain.adj_mat.DENSE_MAX_BYTES", 8)
+
+    assert AdjMat.from_call_tree(CALL_TREE).inner.is_sparse
+    assert not AdjMat.from_call_tree(CALL_TREE, sparse=False).inner.is_sparse
+
+
+def test_community_labels_match_relabelling():
+    rng = np.random.default_rng(0)
+    communities = rng.integers(0, 20, 50)
+    labels = CommunityLabels.from_list(communities.tolist())
+
+    for _ in range(100):
+        keep, absorb = rng.integers(0, 25, 2).tolist()
+        communities[communities == absorb] = keep
+        labels.merge(keep, absorb)
+        assert labels.to_list() == communities.tolist()
+
+
+def test_call_graph_matches_call_tree():
+    entities = {name: FuncCST(name, "", calls) for name, calls in CALL_TREE.items()}
+
+    graph = create_call_graph(entities).inner
+    expected = AdjMat.from_call_tree(CALL_TREE, sparse=False).inner
+    adj_mat = AdjMat.from_call_graph(graph, sparse=False).inner
+
+    assert graph.symbols == dict(enumerate(CALL_TREE))
+    np.testing.assert_array_equal(graph.callers, [0, 0, 0, 2, 5, 5, 6, 7, 7])
+    np.testing.assert_array_equal(graph.callees, [1, 1, 4, 4, 4, 6, 5, 4, 4])
+    np.testing.assert_array_equal(adj_mat.mat, expected.mat)
+    assert adj_mat.node_map is graph.symbols
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from spaghettree.domain.annealing import AnnealingState, anneal, optimise_communities_sa
+from spaghettree.domain.optimisation import get_dwm
+from spaghettree.domain.partition import WeightedGraph
+
+
+@pytest.mark.parametrize("propose", ["propose_move", "propose_merge", "propose_split"])
+def test_proposal_gains_match_get_dwm(propose, planted_adj_mat):
+    adj_mat = planted_adj_mat(4, 10, seed=0)
+    labels = (np.arange(40) // 4).tolist()
+    state = AnnealingState.from_labels(WeightedGraph.from_adj_mat(adj_mat), labels, seed=0)
+
+    n_applied = 0
+    for _ in range(200):
+        if (proposal := getattr(state, propose)()) is None:
+            continue
+        gain, apply = proposal
+        before = get_dwm(adj_mat, state.partition.labels)
+        apply()
+        n_applied += 1
+        assert get_dwm(adj_mat, state.partition.labels) - before == pytest.approx(gain)
+        assert state.partition.modularity() == pytest.approx(before + gain)
+        assert all(
+            state.partition.labels[member] == comm
+            for comm, members in state.members.items()
+            for member in members
+        )
+
+    assert n_applied
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_optimise_communities_sa(seed, planted_adj_mat):
+    adj_mat = planted_adj_mat(5, 12, seed=seed)
+    base_score = get_dwm(adj_mat, adj_mat.communities)
+
+    res = optimise_communities_sa(adj_mat, max_iters=20_000, seed=seed)
+
+    assert res.is_ok()
+    communities = res.inner.communities
+    assert get_dwm(adj_mat, communities) > base_score
+    assert all(communities[label] == label for label in communities)
+    assert (
+        optimise_communities_sa(adj_mat, max_iters=20_000, seed=seed).inner.communities
+        == communities
+    )
+
+
+def test_optimise_communities_sa_never_returns_worse(planted_adj_mat):
+    adj_mat = planted_adj_mat(5, 12, seed=0)
+    adj_mat.communities = (np.arange(60) // 12).tolist()
+
+    res = optimise_communities_sa(adj_mat, plateau=1, seed=0)
+
+    assert res.is_ok()
+    assert get_dwm(adj_mat, res.inner.communities) >= get_dwm(adj_mat, adj_mat.communities)
+
+
+def test_optimise_communities_sa_zero_iters(planted_adj_mat):
+    adj_mat = planted_adj_mat(3, 6, seed=0)
+    communities = (np.arange(18) // 2).tolist()
+    adj_mat.communities = communities
+
+    res = optimise_communities_sa(adj_mat, max_iters=0, seed=0)
+    assert res.is_ok()
+    assert res.inner.communities == communities
+
+    state = AnnealingState.from_labels(WeightedGraph.from_adj_mat(adj_mat), communities, 0)
+    assert anneal(state, max_iters=0) == communities
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from spaghettree.domain.genetic import (
+    batch_dwm,
+    canonical_labels,
+    crossover,
+    optimise_communities_gen,
+)
+from spaghettree.domain.optimisation import get_dwm
+
+
+def test_batch_dwm_matches_get_dwm(planted_adj_mat):
+    adj_mat = planted_adj_mat(4, 10, seed=0)
+    rng = np.random.default_rng(0)
+    population = canonical_labels(rng.integers(0, 8, (16, 40)))
+    rows, cols, weights = adj_mat.edges
+
+    scores = batch_dwm(population, rows, cols, weights, adj_mat.in_degree, adj_mat.out_degree)
+
+    assert scores == pytest.approx([get_dwm(adj_mat, labels.tolist()) for labels in population])
+
+
+def test_canonical_labels():
+    population = np.array([[7, 7, 3, 9, 3], [-1, 4, 4, -1, 2]])
+    assert canonical_labels(population).tolist() == [[0, 0, 2, 3, 2], [0, 1, 1, 0, 4]]
+
+
+def test_crossover_copies_whole_communities():
+    rng = np.random.default_rng(0)
+    first = canonical_labels(rng.integers(0, 5, (8, 30)))
+    second = canonical_labels(rng.integers(0, 5, (8, 30)))
+
+    children = crossover(first, second, rng)
+
+    for child, first_parent, second_parent in zip(children, first, second, strict=True):
+        for comm in set(child.tolist()):
+            members = child == comm
+            # a whole community of the second parent or what is left of one of the first
+            is_second = (second_parent == second_parent[members][0]).tolist() == members.tolist()
+            is_first = len(set(first_parent[members].tolist())) == 1
+            assert is_second or is_first
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_optimise_communities_gen(jobs, planted_adj_mat):
+    adj_mat = planted_adj_mat(5, 12, seed=0)
+    base_score = get_dwm(adj_mat, adj_mat.communities)
+
+    res = optimise_communities_gen(adj_mat, max_iters=20, seed=0, jobs=jobs)
+
+    assert res.is_ok()
+    communities = res.inner.communities
+    assert get_dwm(adj_mat, communities) > base_score
+    assert all(communities[label] == label for label in communities)
+    assert optimise_communities_gen(adj_mat, max_iters=20, seed=0).inner.communities == communities
+
+
+@pytest.mark.parametrize(
+    ("population_size", "n_elite"),
+    [
+        pytest.param(8, -1, id="negative"),
+        pytest.param(8, 8, id="whole_population"),
+        pytest.param(8, 9, id="above_population"),
+    ],
+)
+def test_optimise_communities_gen_rejects_n_elite(population_size, n_elite, planted_adj_mat):
+    res = optimise_communities_gen(
+        planted_adj_mat(2, 4, seed=0),
+        max_iters=1,
+        population_size=population_size,
+        n_elite=n_elite,
+    )
+
+    assert not res.is_ok()
+    assert isinstance(res.error, ValueError)
@@ -0,0 +1,51 @@
+import pytest
+
+from spaghettree.domain.hill_climbing import hill_climb, optimise_communities_hc
+from spaghettree.domain.optimisation import get_dwm, optimise_communities
+from spaghettree.domain.partition import Partition, WeightedGraph
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_optimise_communities_hc_does_not_lower_greedy_score(seed, planted_adj_mat):
+    greedy = optimise_communities(planted_adj_mat(5, 12, seed=seed)).inner
+    base_score = get_dwm(greedy, greedy.communities)
+
+    res = optimise_communities_hc(greedy, seed=seed)
+
+    assert res.is_ok()
+    communities = res.inner.communities
+    assert get_dwm(greedy, communities) >= base_score
+    assert all(communities[label] == label for label in communities)
+
+
+def test_hill_climb_reaches_local_optimum(planted_adj_mat):
+    adj_mat = planted_adj_mat(4, 10, seed=0)
+    partition = Partition.from_labels(WeightedGraph.from_adj_mat(adj_mat), [0] * 40)
+
+    hill_climb(partition, plateau=40)
+
+    assert all(partition.best_move(node, isolate=True)[1] <= 1e-12 for node in range(40))
+    assert partition.modularity() == pytest.approx(get_dwm(adj_mat, partition.labels))
+
+
+@pytest.mark.parametrize(
+    ("max_iters", "expected_iters"),
+    [
+        pytest.param(0, 0, id="no iterations"),
+        pytest.param(25, 25, id="iteration limit"),
+    ],
+)
+def test_hill_climb_max_iters(max_iters, expected_iters, planted_adj_mat):
+    adj_mat = planted_adj_mat(4, 10, seed=0)
+    partition = Partition.from_labels(WeightedGraph.from_adj_mat(adj_mat), list(range(40)))
+
+    assert hill_climb(partition, max_iters=max_iters, plateau=40) == expected_iters
+
+
+def test_hill_climb_plateau(planted_adj_mat):
+    adj_mat = planted_adj_mat(4, 10, seed=0)
+    partition = Partition.from_labels(WeightedGraph.from_adj_mat(adj_mat), list(range(40)))
+    hill_climb(partition, plateau=40)
+
+    # from a local optimum no move improves so it stops after `plateau` iterations
+    assert hill_climb(partition, plateau=3) == 3
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.louvain import optimise_communities_louvain
+from spaghettree.domain.optimisation import get_dwm
+from spaghettree.domain.partition import Partition, WeightedGraph
+
+
+@pytest.mark.parametrize(
+    "communities",
+    [
+        pytest.param([0, 1, 2, 3, 4, 5], id="singletons"),
+        pytest.param([0, 0, 2, 3, 2, 5], id="partially merged"),
+    ],
+)
+def test_move_gain_matches_get_dwm(communities, mat):
+    adj_mat = AdjMat(mat, {i: str(i) for i in range(len(mat))}, communities)
+    partition = Partition.from_labels(WeightedGraph.from_adj_mat(adj_mat), communities)
+    base_score = get_dwm(adj_mat, communities)
+    assert partition.modularity() == pytest.approx(base_score)
+
+    for node in range(len(mat)):
+        nbr_weights = partition.neighbour_weights(node)
+        for target in set(communities) | {node}:
+            moved = communities.copy()
+            moved[node] = target
+            expected = get_dwm(adj_mat, moved) - base_score
+            assert partition.move_gain(node, target, nbr_weights) == pytest.approx(expected)
+
+
+def test_aggregate_keeps_modularity(planted_adj_mat):
+    adj_mat = planted_adj_mat(4, 10, seed=0)
+    graph = WeightedGraph.from_adj_mat(adj_mat)
+    labels = (np.arange(40) // 5).tolist()
+
+    aggregated, node_map = graph.aggregate(labels)
+    super_labels = [0] * aggregated.n_nodes
+    for node, super_node in enumerate(node_map):
+        super_labels[super_node] = node // 10
+
+    assert Partition.from_labels(aggregated, super_labels).modularity() == pytest.approx(
+        get_dwm(adj_mat, (np.arange(40) // 10).tolist())
+    )
+
+
+@pytest.mark.parametrize("refine", [False, True])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_optimise_communities_louvain(refine, seed, planted_adj_mat):
+    adj_mat = planted_adj_mat(5, 12, seed=seed)
+    base_score = get_dwm(adj_mat, adj_mat.communities)
+
+    res = optimise_communities_louvain(adj_mat, refine=refine, seed=seed)
+
+    assert res.is_ok()
+    communities = res.inner.communities
+    assert get_dwm(adj_mat, communities) > base_score
+    # communities are labelled by their lowest node index
+    assert all(communities[label] == label for label in communities)
+    assert all(communities[node] <= node for node in range(len(communities)))
+
+
+def test_optimise_communities_louvain_no_edges():
+    adj_mat = AdjMat(np.zeros((3, 3), dtype=int), {i: str(i) for i in range(3)}, [0, 1, 2])
+
+    res = optimise_communities_louvain(adj_mat)
+
+    assert res.is_ok()
+    assert res.inner.communities == [0, 1, 2]
+
+
+@pytest.mark.parametrize("isolate", [False, True])
+def test_best_move_matches_move_gain(isolate, planted_adj_mat):
+    adj_mat = planted_adj_mat(3, 6, seed=0)
+    labels = [0] * 9 + [9] * 9
+    partition = Partition.from_labels(WeightedGraph.from_adj_mat(adj_mat), labels)
+
+    for node in range(18):
+        nbr_weights = partition.neighbour_weights(node)
+        targets = set(nbr_weights) | ({partition.empty_label()} if isolate else set())
+        expected = max(partition.move_gain(node, target, nbr_weights) for target in targets)
+        best, gain = partition.best_move(node, isolate=isolate)
+        assert gain == pytest.approx(max(expected, 0.0))
+        assert partition.move_gain(node, best, nbr_weights) == pytest.approx(gain)
@@ -0,0 +1,54 @@
+from functools import partial
+
+import pytest
+
+from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.louvain import optimise_communities_louvain
+from spaghettree.domain.multistart import optimise_multi_start, run_start
+from spaghettree.domain.optimisation import get_dwm, optimise_communities
+
+
+@pytest.mark.parametrize(
+    "optimiser",
+    [
+        pytest.param(optimise_communities, id="greedy"),
+        pytest.param(partial(optimise_communities_louvain, refine=False), id="louvain"),
+    ],
+)
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize("sparse", [False, True])
+def test_optimise_multi_start(planted_adj_mat, optimiser, jobs, sparse):
+    adj_mat = planted_adj_mat(6, 8, seed=0, sparse=sparse)
+    starts = [run_start(adj_mat, optimiser, seed) for seed in (None, 3, 4, 5)]
+
+    reported = []
+
+    res = optimise_multi_start(
+        adj_mat,
+        optimiser,
+        restarts=4,
+        jobs=jobs,
+        seed=3,
+        on_start=lambda idx, start: reported.append((idx, start.seed, start.communities)),
+    )
+
+    assert res.is_ok()
+    assert reported == [(idx, start.seed, start.communities) for idx, start in enumerate(starts)]
+    score = get_dwm(adj_mat, res.inner.communities)
+    assert score == max(start.score for start in starts)
+    assert res.inner.communities == max(starts, key=lambda start: start.score).communities
+    # the input is left as it was for the other starts
+    assert adj_mat.communities == list(range(48))
+
+
+def test_seeded_greedy_is_reproducible(planted_adj_mat):
+    adj_mat = planted_adj_mat(6, 8, seed=0)
+
+    runs = [
+        optimise_communities(AdjMat(adj_mat.mat, adj_mat.node_map, list(range(48))), seed=seed)
+        for seed in (None, 1, 1, 2)
+    ]
+
+    assert all(res.is_ok() for res in runs)
+    assert runs[1].inner.communities == runs[2].inner.communities
+    assert len({tuple(res.inner.communities) for res in runs}) > 1
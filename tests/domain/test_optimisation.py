@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from spaghettree.domain.adj_mat import AdjMat
+from spaghettree.domain.optimisation import (
+    CommunityGraph,
+    get_dwm,
+    get_module_communities,
+    get_partition,
+    optimise_communities,
+    warm_start_communities,
+)
+
+
+def dense_dwm(mat: np.ndarray, communities: list[int]) -> float:
+    # reference implementation building the full expected and community matrices
+    out_degree = mat.sum(axis=0)
+    in_degree = mat.sum(axis=1)
+    total_edges = out_degree.sum()
+
+    communities = np.array(communities)
+    community_mat = communities[:, None] == communities[None, :]
+
+    expected_matrix = np.outer(out_degree, in_degree) / total_edges
+    modularity_matrix = (mat - expected_matrix) * community_mat
+    return modularity_matrix.sum() / total_edges
+
+
+@pytest.mark.parametrize(
+    "communities",
+    [
+        pytest.param([0, 1, 2, 3, 4, 5], id="singletons"),
+        pytest.param([0, 0, 2, 3, 2, 5], id="partially merged"),
+        pytest.param([5, 5, 5, 5, 5, 5], id="one community"),
+    ],
+)
+@pytest.mark.parametrize("sparse", [False, True])
+def test_get_dwm_matches_dense_reference(communities, sparse, mat):
+    call_tree = {
+        str(src): [str(dst) for dst in range(len(mat)) for _ in range(mat[src, dst])]
+        for src in range(len(mat))
+    }
+    adj_mat = AdjMat.from_call_tree(call_tree, sparse=sparse).inner
+
+    assert get_dwm(adj_mat, communities) == pytest.approx(dense_dwm(mat, communities), abs=1e-12)
+
+
+def test_get_dwm_matches_dense_reference_random():
+    rng = np.random.default_rng(0)
+    mat = (rng.random((40, 40)) < 0.1) * rng.integers(1, 5, (40, 40))
+    adj_mat = AdjMat(mat, {i: str(i) for i in range(40)}, list(range(40)))
+
+    for _ in range(20):
+        communities = rng.integers(0, 40, 40).tolist()
+        assert get_dwm(adj_mat, communities) == pytest.approx(
+            dense_dwm(mat, communities), abs=1e-12
+        )
+
+
+@pytest.mark.parametrize(
+    "communities",
+    [
+        pytest.param([0, 1, 2, 3, 4, 5], id="singletons"),
+        pytest.param([0, 0, 2, 3, 2, 5], id="partially merged"),
+    ],
+)
+def test_merge_gain_matches_get_dwm(communities, mat):
+    adj_mat = AdjMat(mat, {i: str(i) for i in range(len(mat))}, communities)
+    graph = CommunityGraph.from_adj_mat(adj_mat)
+    base_score = get_dwm(adj_mat, communities)
+
+    for c1 in set(communities):
+        for c2 in set(communities) - {c1}:
+            merged = [c1 if c == c2 else c for c in communities]
+            expected = get_dwm(adj_mat, merged) - base_score
+            assert graph.merge_gain(c1, c2) == pytest.approx(expected)
+
+
+def test_merge_matches_rebuilt_graph(mat):
+    adj_mat = AdjMat(mat, {i: str(i) for i in range(len(mat))}, [0, 1, 2, 3, 4, 5])
+    graph = CommunityGraph.from_adj_mat(adj_mat)
+    graph.merge(2, 4)
+    graph.merge(1, 2)
+
+    rebuilt = CommunityGraph.from_adj_mat(
+        AdjMat(mat, adj_mat.node_map, [0, 1, 1, 3, 1, 5]),
+    )
+    assert graph.labels.to_list() == [0, 1, 1, 3, 1, 5]
+    assert graph.links == rebuilt.links
+    assert graph.internal == rebuilt.internal
+    assert graph.in_degree == rebuilt.in_degree
+    assert graph.out_degree == rebuilt.out_degree
+
+
+def test_optimise_communities_increases_score(mat):
+    adj_mat = AdjMat(mat, {i: str(i) for i in range(len(mat))}, [0, 1, 2, 3, 4, 5])
+    base_score = get_dwm(adj_mat, adj_mat.communities)
+
+    res = optimise_communities(adj_mat)
+
+    assert res.is_ok()
+    assert get_dwm(adj_mat, res.inner.communities) > base_score
+
+
+def test_warm_start_communities(mat):
+    node_map = {0: "mod.a", 1: "mod.new", 2: "mod.b", 3: "mod.c", 4: "mod.d"}
+    adj_mat = AdjMat(mat[:5, :5], node_map, [0, 1, 2, 3, 4])
+    # "mod.removed" is no longer an entity and "mod.new" wasn't in the previous run
+    partition = {"mod.a": 7, "mod.b": 3, "mod.c": 7, "mod.d": 3, "mod.removed": 7}
+
+    res = warm_start_communities(adj_mat, partition)
+
+    assert res.is_ok()
+    assert res.inner.communities == [0, 1, 2, 0, 2]
+    assert get_partition(res.inner) == {
+        "mod.a": 0,
+        "mod.new": 1,
+        "mod.b": 2,
+        "mod.c": 0,
+        "mod.d": 2,
+    }
+
+
+def test_get_module_communities(mat):
+    node_map = {0: "pkg.a.f", 1: "pkg.b.g", 2: "pkg.a.C", 3: "pkg.b.h", 4: "pkg.f"}
+    adj_mat = AdjMat(mat[:5, :5], node_map, [0, 0, 0, 0, 0])
+    assert get_module_communities(adj_mat) == [0, 1, 0, 1, 4]
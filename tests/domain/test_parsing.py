@@ -0,0 +1,148 @@
+import pytest
+
+from benchmarks.synthetic import SyntheticSpec, generate_package
+from spaghettree.adapters.io_wrapper import FakeIOWrapper, IOWrapper
+from spaghettree.domain import parsing
+from spaghettree.domain.parsing import create_module_cst_objs
+
+
+@pytest.mark.parametrize(
+    "jobs",
+    [
+        pytest.param(1, id="serial"),
+        pytest.param(2, id="pool"),
+    ],
+)
+def test_streamed_sources_match_dict(jobs):
+    files = generate_package(SyntheticSpec(n_files=20))
+    expected = create_module_cst_objs(files).inner
+
+    res = create_module_cst_objs(iter(files.items()), jobs=jobs)
+
+    assert res.is_ok()
+    assert list(res.inner) == list(expected)
+    assert res.inner == expected
+
+
+def test_sources_are_parsed_as_they_are_read(monkeypatch):
+    files = generate_package(SyntheticSpec(n_files=5))
+    events = []
+
+    def sources():
+        for path, code in files.items():
+            events.append(("read", path))
+            yield path, code
+
+    parse_module_cst = parsing.parse_module_cst
+
+    def record_parse(path, code):
+        events.append(("parse", path))
+        return parse_module_cst(path, code)
+
+    monkeypatch.setattr(parsing, "parse_module_cst", record_parse)
+    assert create_module_cst_objs(sources()).is_ok()
+
+    assert events == [(event, path) for path in files for event in ("read", "parse")]
+
+
+@pytest.mark.parametrize(
+    "io",
+    [
+        pytest.param(IOWrapper(), id="real"),
+        pytest.param(FakeIOWrapper(), id="fake"),
+    ],
+)
+def test_stream_files(io, tmp_path):
+    files = {
+        f"{tmp_path}/src/pkg/mod_a.py": "def func_a():\n    return 1\n",
+        f"{tmp_path}/src/pkg/mod_b.py": "def func_b():\n    return 2\n",
+    }
+    for path, code in files.items():
+        io.write(code, path, format_code=False)
+
+    res = io.stream_files(f"{tmp_path}/src")
+    assert res.is_ok()
+    assert dict(res.inner) == files
+
+    # a file that disappears before it is reached fails the parse instead of the listing
+    res = io.stream_files(f"{tmp_path}/src")
+    assert res.is_ok()
+    if isinstance(io, FakeIOWrapper):
+        del io.files[f"{tmp_path}/src/pkg/mod_b.py"]
+    else:
+        (tmp_path / "src/pkg/mod_b.py").unlink()
+    assert not create_module_cst_objs(res.inner).is_ok()
+
+
+def test_entities_own_only_the_imports_they_use():
+    files = {
+        "/root/src/pkg/mod_b.py": "def helper():\n    return 1\n",
+        "/root/src/pkg/mod_a.py": (
+            "from __future__ import annotations\n"
+            "import os.path\n"
+            "import numpy as np\n"
+            "from pkg.mod_b import helper\n\n"
+            "def uses_np():\n    return np.zeros(helper()) + helper()\n\n"
+            "def uses_os():\n    return os.path.sep\n"
+        ),
+    }
+    res = (
+        create_module_cst_objs(files)
+        .and_then(parsing.resolve_module_calls)
+        .and_then(parsing.extract_entities)
+        .and_then(parsing.filter_non_native_calls)
+    )
+
+    assert res.is_ok()
+    uses_np, uses_os = res.inner["pkg.mod_a.uses_np"], res.inner["pkg.mod_a.uses_os"]
+    assert [imp.to_str() for imp in uses_np.imports] == [
+        "from __future__ import annotations\n",
+        "import numpy as np\n",
+        "from pkg.mod_b import helper\n",
+    ]
+    assert [imp.to_str() for imp in uses_os.imports] == [
+        "from __future__ import annotations\n",
+        "import os.path\n",
+    ]
+    assert res.inner["pkg.mod_b.helper"].imports == []
+
+
+def test_parse_module_cst():
+    code = (
+        "# header\n"
+        "import os.path, json\n"
+        "from pkg import helper as aliased\n\n"
+        "@decorate(\n    setting(),\n)\n"
+        "def func():\n"
+        "    def nested():\n        return inner()\n"
+        "    return aliased(LIMIT)\n\n"
+        "class Thing(Base):\n"
+        "    attr = build()\n\n"
+        "    def method(self):\n        return os.path.join(LIMIT)\n\n"
+        "LIMIT = 3\n"
+        "__all__ = ['func']\n"
+    )
+    mod = parsing.parse_module_cst("/root/src/pkg/mod.py", code)
+
+    assert mod.name == "pkg.mod"
+    assert [imp.to_str() for imp in mod.imports] == [
+        "import os.path\n",
+        "import json\n",
+        "from pkg import helper as aliased\n",
+    ]
+    assert [(fn.name, fn.calls) for fn in mod.funcs] == [
+        ("pkg.mod.func", ["decorate", "setting", "inner", "aliased"]),
+    ]
+    assert mod.funcs[0].code.startswith("\n@decorate(")
+    assert [(cls_.name, [(m.name, m.calls) for m in cls_.methods]) for cls_ in mod.classes] == [
+        ("pkg.mod.Thing", [("pkg.mod.Thing.method", ["os.path.join"])]),
+    ]
+    assert [(gbl.name, gbl.code, gbl.referenced) for gbl in mod.global_vars] == [
+        ("pkg.mod.LIMIT", "\nLIMIT = 3\n", ["pkg.mod.func", "pkg.mod.Thing"]),
+    ]
+    assert {loc.name: loc.line_no for loc in mod.locations} == {
+        "func": 8,
+        "Thing": 13,
+        "LIMIT": 19,
+        "__all__": 20,
+    }
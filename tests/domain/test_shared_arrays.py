@@ -0,0 +1,16 @@
+import numpy as np
+
+from spaghettree.domain.shared_arrays import SharedArrays
+
+
+def test_shared_arrays_round_trip():
+    arrays = {"a": np.arange(5), "b": np.ones((2, 3))}
+    shared = SharedArrays.create(arrays)
+    try:
+        attached = SharedArrays.attach(shared.spec)
+        attached.arrays["a"][0] = 10
+        assert shared.arrays["a"].tolist() == [10, 1, 2, 3, 4]
+        assert attached.arrays["b"].tolist() == arrays["b"].tolist()
+        attached.close()
+    finally:
+        shared.close(unlink=True)
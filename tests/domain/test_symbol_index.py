@@ -0,0 +1,48 @@
+import pytest
+
+from spaghettree.domain.parsing import create_module_cst_objs
+from spaghettree.domain.symbol_index import SymbolIndex
+
+FILES = {
+    "/root/src/pkg/__init__.py": "from pkg.mod_b import func_b\n",
+    "/root/src/pkg/mod_b.py": (
+        "from pkg.cycle_a import loop\n\n"
+        "def func_b():\n    return 1\n\n"
+        "class Thing:\n    def method(self):\n        return func_b()\n"
+    ),
+    "/root/src/pkg/cycle_a.py": "from pkg.cycle_b import loop\n",
+    "/root/src/pkg/cycle_b.py": "from pkg.cycle_a import loop\n",
+    "/root/src/pkg/mod_a.py": (
+        "import json\n"
+        "import pkg.mod_b\n"
+        "from pkg import mod_b\n"
+        "from pkg.mod_b import func_b as renamed\n"
+        "from pkg.mod_b import Thing\n\n"
+        "def func_a():\n    return 1\n"
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SymbolIndex.from_modules(create_module_cst_objs(FILES).inner.values())
+
+
+@pytest.mark.parametrize(
+    ("module", "call", "expected"),
+    [
+        pytest.param("pkg.mod_a", "func_a", "pkg.mod_a.func_a", id="local"),
+        pytest.param("pkg.mod_a", "renamed", "pkg.mod_b.func_b", id="aliased_import"),
+        pytest.param("pkg.mod_a", "mod_b.func_b", "pkg.mod_b.func_b", id="imported_module"),
+        pytest.param("pkg.mod_a", "pkg.mod_b.func_b", "pkg.mod_b.func_b", id="plain_import"),
+        pytest.param("pkg.mod_a", "pkg.func_b", "pkg.mod_b.func_b", id="init_reexport"),
+        pytest.param("pkg.mod_a", "Thing.method", "pkg.mod_b.Thing", id="method"),
+        pytest.param("pkg.mod_b", "func_b", "pkg.mod_b.func_b", id="same_module"),
+        pytest.param("pkg.mod_a", "json.dumps", None, id="external"),
+        pytest.param("pkg.mod_a", "print", None, id="builtin"),
+        pytest.param("pkg.mod_b", "loop", None, id="import_cycle"),
+        pytest.param("pkg.missing", "func_a", None, id="unknown_module"),
+    ],
+)
+def test_resolve(index, module, call, expected):
+    assert index.resolve(index.scope(module), call) == expected
@@ -0,0 +1,32 @@
+import pytest
+
+from spaghettree.domain.symbols import SymbolTable
+
+
+def test_intern():
+    table = SymbolTable()
+
+    assert table.intern("pkg.mod.func") == 0
+    assert table.intern("pkg.mod.Class") == 1
+    assert table.intern("pkg.mod.func") == 0
+    assert table.intern("top") == 2
+
+    assert table.names == ["pkg.mod.func", "pkg.mod.Class", "top"]
+    assert table.modules == ["pkg.mod", "pkg.mod", ""]
+    assert table.leaves == ["func", "Class", "top"]
+    assert table.ids == {"pkg.mod.func": 0, "pkg.mod.Class": 1, "top": 2}
+
+
+def test_reads_as_node_map():
+    node_map = {0: "mod.a", 1: "mod.b", 2: "other.c"}
+    table = SymbolTable.from_node_map(node_map)
+
+    assert table == node_map
+    assert list(table.items()) == list(node_map.items())
+    assert len(table) == 3
+    assert table[2] == "other.c"
+    assert 3 not in table
+    assert -1 not in table
+    with pytest.raises(KeyError):
+        table[3]
+    assert SymbolTable.from_node_map(table) is table
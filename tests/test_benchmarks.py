@@ -0,0 +1,39 @@
+import ast
+
+import pytest
+
+from benchmarks.run import run_pipeline
+from benchmarks.synthetic import SyntheticSpec, generate_package
+from spaghettree.__main__ import RunConfig
+from spaghettree.adapters.io_wrapper import FakeIOWrapper
+from spaghettree.domain.parsing import create_module_cst_objs, extract_entities
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        pytest.param(SyntheticSpec(1), id="single file"),
+        pytest.param(SyntheticSpec.for_entities(80, seed=3), id="from entity count"),
+        pytest.param(SyntheticSpec(5, classes_per_file=0, globals_per_file=0), id="funcs only"),
+    ],
+)
+def test_generate_package(spec):
+    files = generate_package(spec)
+
+    assert len(files) == spec.n_files + 1
+    for code in files.values():
+        ast.parse(code)
+
+    src_code = FakeIOWrapper(files=files).read_files(f"./{spec.package}/src").inner
+    entities = create_module_cst_objs(src_code).and_then(extract_entities).inner
+    assert len(entities) == spec.n_entities
+    assert generate_package(spec) == files
+
+
+def test_run_pipeline():
+    spec = SyntheticSpec(4)
+    report = run_pipeline(generate_package(spec), f"./{spec.package}/src", RunConfig())
+
+    stages = {stage["name"]: stage for stage in report["stages"]}
+    assert {"read", "parse", "optimise", "codegen", "format", "write"} <= set(stages)
+    assert all(stage["ok"] and stage["peak_bytes"] >= 0 for stage in stages.values())
@@ -4,8 +4,19 @@ from pathlib import Path
 
 import pytest
 
-from spaghettree.__main__ import main
-from spaghettree.adapters.io_wrapper import IOWrapper
+from spaghettree.__main__ import (
+    BatchResult,
+    RunConfig,
+    batch_new_root,
+    cli,
+    format_batch_table,
+    main,
+    parse_args,
+    run_batch,
+    run_process,
+)
+from spaghettree.adapters.instrumentation import Instrumentation
+from spaghettree.adapters.io_wrapper import FakeIOWrapper, IOWrapper
 
 
 @pytest.mark.parametrize(
@@ -23,11 +34,13 @@ from spaghettree.adapters.io_wrapper import IOWrapper
         )
     ],
 )
-def test_main(src_root, expected_result):
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize("engine", ["greedy", "louvain", "leiden"])
+def test_main(src_root, expected_result, jobs, engine):
     try:
         tmp = str(Path("./tmp_test_src_dir").absolute())
         os.makedirs(tmp, exist_ok=True)
-        res = main(src_root, tmp)
+        res = main(src_root, tmp, RunConfig(engine=engine, jobs=jobs))
         assert res.is_ok()
 
         io = IOWrapper()
@@ -41,3 +54,200 @@ def test_main(src_root, expected_result):
 
     finally:
         shutil.rmtree(tmp)
+
+
+def test_run_process_warm_start():
+    src_root = "./mock_package/src"
+    files = IOWrapper().read_files(src_root).inner
+    io = FakeIOWrapper(files=dict(files))
+    config = RunConfig(partition_path="./partition.json")
+
+    assert run_process(io, src_root, "./cold", config).is_ok()
+    partition = io.read_json("./partition.json").inner
+    assert set(partition) == {
+        "mock_package.module_a.func_a",
+        "mock_package.module_a.func_b",
+        "mock_package.module_a.func_c",
+        "mock_package.module_a.isolated_func",
+        "mock_package.module_b.CONSTANT",
+        "mock_package.module_b.func_e",
+        "mock_package.module_b.func_d",
+        "mock_package.module_b.ClassA",
+    }
+
+    def groups(partition: dict[str, int]) -> set[frozenset[str]]:
+        return {
+            frozenset(ent for ent, ent_comm in partition.items() if ent_comm == comm)
+            for comm in partition.values()
+        }
+
+    assert run_process(io, src_root, "./warm", config).is_ok()
+    assert groups(io.read_json("./partition.json").inner) == groups(partition)
+
+    def outputs(root: str) -> dict[str, str]:
+        return {k.removeprefix(root): v for k, v in io.files.items() if k.startswith(root)}
+
+    assert outputs("./warm") == outputs("./cold")
+
+
+def test_run_process_rerun_writes_nothing():
+    src_root = "./mock_package/src"
+    io = FakeIOWrapper(files=dict(IOWrapper().read_files(src_root).inner))
+    config = RunConfig(formatter="none", prune=True)
+
+    assert run_process(io, src_root, "./out", config).inner.counts()["created"] == 5
+    io.files["./out/mock_package/stale.py"] = "STALE = 1\n"
+
+    res = run_process(io, src_root, "./out", config)
+    assert res.is_ok()
+    assert res.inner.counts() == {"created": 0, "changed": 0, "unchanged": 5, "deleted": 1}
+    assert "./out/mock_package/stale.py" not in io.files
+
+
+def test_cli_prints_write_summary(tmp_path, capsys):
+    argv = ["--process", "./mock_package/src", "--new-root", str(tmp_path), "--no-cache"]
+
+    assert cli(argv).is_ok()
+    assert "files: 5 created, 0 changed, 0 unchanged, 0 deleted" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    ("argv", "expected"),
+    [
+        pytest.param(["--process", "src"], {"engine": "greedy", "refiners": []}, id="defaults"),
+        pytest.param(
+            ["--process", "src", "--engine", "leiden", "--use-hc", "--plateau", "10"],
+            {"engine": "leiden", "refiners": ["hc"], "plateau": 10},
+            id="hill climbing",
+        ),
+        pytest.param(
+            ["--process", "src", "--use-sa", "--use-hc", "--seed", "1", "--time-budget", "2.5"],
+            {"refiners": ["sa", "hc"], "seed": 1, "time_budget": 2.5},
+            id="annealing then hill climbing",
+        ),
+        pytest.param(
+            ["--process", "src", "--use-hc", "--use-sa", "--use-gen", "-j", "4"],
+            {"refiners": ["hc", "sa", "gen"], "jobs": 4},
+            id="every refiner",
+        ),
+        pytest.param(
+            ["--process", "src", "--restarts", "8", "--jobs", "4", "--seed", "3"],
+            {"restarts": 8, "jobs": 4, "seed": 3},
+            id="multi start",
+        ),
+        pytest.param(
+            ["--batch", "a/src", "b/src", "-j", "2", "--timeout", "60", "--memory-limit", "512"],
+            {"batch": ["a/src", "b/src"], "src_root": None, "timeout": 60, "memory_limit": 512},
+            id="batch",
+        ),
+        pytest.param(
+            ["--process", "src", "--formatter", "black", "--prune"],
+            {"formatter": "black", "prune": True},
+            id="formatting",
+        ),
+    ],
+)
+def test_parse_args(argv, expected):
+    args = parse_args(argv)
+    assert {key: getattr(args, key) for key in expected} == expected
+
+
+def test_run_process_report():
+    src_root = "./mock_package/src"
+    io = FakeIOWrapper(files=dict(IOWrapper().read_files(src_root).inner))
+    records = []
+    config = RunConfig(
+        instrumentation=Instrumentation(callback=records.append),
+        report_path="./report.json",
+    )
+
+    assert run_process(io, src_root, "./out", config).is_ok()
+
+    report = io.read_json("./report.json").inner
+    names = [stage["name"] for stage in report["stages"]]
+    assert names == [record.name for record in records]
+    assert names[:2] == ["read", "parse"]
+    assert names[-2:] == ["format", "write"]
+    assert {"resolve", "filter", "adj_mat", "pairing", "optimise", "naming", "codegen"} <= set(
+        names
+    )
+
+
+def test_run_batch():
+    try:
+        out_dir = str(Path("./tmp_test_batch_dir").absolute())
+        roots = ["./mock_package/src", "./missing_package/src", "./mock_package/src"]
+
+        results = run_batch(roots, out_dir, jobs=2, timeout=120)
+
+        assert [res.root for res in results] == roots
+        assert [res.status for res in results] == ["ok", "error", "ok"]
+        assert results[0].n_entities == 8
+        assert results[0].dwm_after >= results[0].dwm_before
+        assert results[1].error
+        assert os.path.exists(f"{out_dir}/000_mock_package/mock_package/module_a.py")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def test_run_batch_keeps_partition_and_report_per_package():
+    try:
+        out_dir = str(Path("./tmp_test_batch_dir").absolute())
+        config = RunConfig(partition_path="./partition.json", report_path="./report.json")
+
+        results = run_batch(["./mock_package/src", "./mock_package/src"], out_dir, config)
+
+        assert [res.status for res in results] == ["ok", "ok"]
+        for new_root in ("000_mock_package", "001_mock_package"):
+            assert os.path.exists(f"{out_dir}/{new_root}/partition.json")
+            assert os.path.exists(f"{out_dir}/{new_root}/report.json")
+        assert not os.path.exists("./partition.json")
+        assert not os.path.exists("./report.json")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+@pytest.mark.parametrize(
+    ("options", "expected_status"),
+    [
+        pytest.param({"timeout": 0.01}, "timeout", id="timeout"),
+        pytest.param(
+            {"memory_limit": 2**24},
+            "error",
+            id="memory limit",
+            marks=pytest.mark.skipif(os.name != "posix", reason="needs setrlimit"),
+        ),
+    ],
+)
+def test_run_batch_limits(options, expected_status):
+    try:
+        out_dir = str(Path("./tmp_test_batch_dir").absolute())
+        (result,) = run_batch(["./mock_package/src"], out_dir, **options)
+        assert result.status == expected_status
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+@pytest.mark.parametrize(
+    ("root", "expected"),
+    [
+        pytest.param("./mock_package/src", "out/001_mock_package", id="src layout"),
+        pytest.param("/repos/some pkg", "out/001_repos_some_pkg", id="sanitised"),
+    ],
+)
+def test_batch_new_root(root, expected):
+    assert batch_new_root("out", 1, root) == expected
+
+
+def test_format_batch_table():
+    table = format_batch_table(
+        [
+            BatchResult("a/src", "ok", 10, 0.25, 0.5, 1.234),
+            BatchResult("b/src", "timeout", wall_s=60.0),
+        ],
+    )
+    assert table.splitlines() == [
+        "root   status   entities  dwm before  dwm after  wall s  error",
+        "a/src  ok       10        0.2500      0.5000     1.23",
+        "b/src  timeout  -         -           -          60.00",
+    ]
@@ -0,0 +1,76 @@
+import gc
+import traceback
+import weakref
+
+import pytest
+
+from spaghettree import ERR_REPR, Err, safe
+
+
+class Payload:
+    def __init__(self, n: int) -> None:
+        self.items = list(range(n))
+
+
+@safe
+def fail_on(payload: Payload, *, big: list[int]) -> None:
+    total = sum(payload.items) + len(big)
+    msg = f"failed after summing to {total}"
+    raise ValueError(msg)
+
+
+def test_err_does_not_keep_inputs_alive():
+    payload = Payload(100_000)
+    ref = weakref.ref(payload)
+
+    res = fail_on(payload, big=list(range(100_000)))
+    del payload
+    gc.collect()
+
+    assert not res.is_ok()
+    assert ref() is None
+    assert res.err_msg == "failed after summing to 5000050000"
+    assert res.error.__traceback__ is None
+    assert len(res.input_args) < 200
+    assert res.details[-1]["func"] == "fail_on"
+    assert res.details[-1]["locals"]["payload"] == "<Payload>"
+    assert res.details[-1]["locals"]["total"] == "5000050000"
+
+
+def test_reraised_error_shows_where_it_was_raised():
+    res = fail_on(Payload(1), big=[])
+
+    with pytest.raises(ValueError, match="failed after summing") as exc_info:
+        raise res.error
+
+    formatted = "".join(traceback.format_exception(exc_info.value))
+    assert "Raised at:" in formatted
+    assert "in fail_on" in formatted
+
+
+def test_chained_errors_are_released():
+    try:
+        try:
+            {}["missing"]
+        except KeyError as e:
+            msg = "lookup failed"
+            raise RuntimeError(msg) from e
+    except RuntimeError as e:
+        res = Err(None, e)
+
+    assert res.error.__traceback__ is None
+    assert res.error.__cause__.__traceback__ is None
+
+
+@pytest.mark.parametrize(
+    ("obj", "expected"),
+    [
+        pytest.param(1.5, "1.5", id="builtin scalar"),
+        pytest.param("x" * 1_000, "'" + "x" * 37 + "..." + "x" * 38 + "'", id="long string"),
+        pytest.param(list(range(1_000)), "[0, 1, 2, 3, ...]", id="long list"),
+        pytest.param(Payload(3), "<Payload>", id="instance"),
+        pytest.param(b"x" * 1_000, "<bytes>", id="bytes"),
+    ],
+)
+def test_err_repr_is_bounded(obj, expected):
+    assert ERR_REPR.repr(obj) == expected